@@ -0,0 +1,69 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import caches
+from django.db import transaction
+
+
+def get_cache():
+    return caches[getattr(settings, "AUTH_USER_CACHE_ALIAS", "default")]
+
+
+def timeout():
+    return getattr(settings, "AUTH_USER_CACHE_TIMEOUT", 300)
+
+
+def user_key(user_id):
+    return f"accounts:user:{user_id}"
+
+
+def invalidate_user(user_id):
+    # After commit, so a request racing the write cannot cache the old row
+    # again once this has run.
+    transaction.on_commit(lambda: get_cache().delete(user_key(user_id)))
+
+
+class CachedModelBackend(ModelBackend):
+    """
+    ModelBackend that loads a session's user together with their Author in
+    one query and caches the pair, so authenticated requests on a warm cache
+    query neither table. blogs.signals invalidates the entry whenever the
+    User or Author row changes.
+    """
+
+    def get_user(self, user_id):
+        cache = get_cache()
+        user = cache.get(user_key(user_id))
+        if user is None:
+            user = self.load_user(user_id)
+            if user is None:
+                return None
+            cache.set(user_key(user_id), user, timeout())
+        return user if self.user_can_authenticate(user) else None
+
+    async def aget_user(self, user_id):
+        cache = get_cache()
+        user = await cache.aget(user_key(user_id))
+        if user is None:
+            user = await self.aload_user(user_id)
+            if user is None:
+                return None
+            await cache.aset(user_key(user_id), user, timeout())
+        return user if self.user_can_authenticate(user) else None
+
+    def users(self):
+        return get_user_model()._default_manager.select_related("author")
+
+    def load_user(self, user_id):
+        UserModel = get_user_model()
+        try:
+            return self.users().get(pk=user_id)
+        except UserModel.DoesNotExist:
+            return None
+
+    async def aload_user(self, user_id):
+        UserModel = get_user_model()
+        try:
+            return await self.users().aget(pk=user_id)
+        except UserModel.DoesNotExist:
+            return None
@@ -1,6 +1,14 @@
-from django.contrib import admin
+import uuid
 
-from .models import Author, BlogPost, Comment
+from django.contrib import admin, messages
+from django.contrib.admin.views.main import ChangeList
+from django.db.models.functions import Substr
+from django.forms.models import BaseInlineFormSet
+
+from .models import Author, BlogPost, Comment, OutboxEmail
+from .pagination import EstimatedCountPaginator
+from .scheduling import archive_posts, publish_posts, unpublish_posts
+from .search import POST, search
 
 
 # Register your models here.
@@ -12,6 +20,7 @@ class StatusFilter(admin.SimpleListFilter):
         return (
             ("draft", "Draft"),
             ("published", "Published"),
+            ("scheduled", "Scheduled"),
             ("archived", "Archived"),
         )
 
@@ -21,9 +30,60 @@ class StatusFilter(admin.SimpleListFilter):
         return queryset
 
 
+class RecentCommentFormSet(BaseInlineFormSet):
+    limit = 20
+
+    def get_queryset(self):
+        if not hasattr(self, "_queryset"):
+            queryset = super().get_queryset()
+            if self.is_bound:
+                # The rows the page was rendered with, even if newer comments
+                # have pushed some of them out of the newest ``limit`` since.
+                self._queryset = queryset.filter(pk__in=self.posted_pks())
+            else:
+                self._queryset = queryset.order_by("-created_at", "-pk")[: self.limit]
+        return self._queryset
+
+    def posted_pks(self):
+        pks = []
+        for index in range(self.initial_form_count()):
+            try:
+                pks.append(uuid.UUID(self.data.get(f"{self.add_prefix(index)}-id")))
+            except (TypeError, ValueError):
+                continue
+        return pks
+
+
 class CommentInline(admin.TabularInline):
+    # A post can have thousands of comments. Only the newest are shown, with
+    # a link to the rest in the comment admin. Author and parent are shown as
+    # text, joined in the inline's one query, rather than as a select of
+    # every author and comment per row; add comments from the comment admin.
     model = Comment
-    extra = 1
+    formset = RecentCommentFormSet
+    template = "admin/blogs/blogpost/comment_inline.html"
+    fields = ("author", "parent", "content")
+    readonly_fields = ("author", "parent")
+    extra = 0
+    show_change_link = True
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related("author", "parent__author")
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
+class BlogPostChangeList(ChangeList):
+    def get_queryset(self, request, exclude_parameters=None):
+        # Rows show the first 75 characters of the content; leave the full
+        # text and its rendered HTML in the database.
+        return (
+            super()
+            .get_queryset(request, exclude_parameters)
+            .defer("content", "content_html")
+            .annotate(content_preview=Substr("content", 1, 76))
+        )
 
 
 @admin.register(BlogPost)
@@ -39,39 +99,100 @@ class BlogPostAdmin(admin.ModelAdmin):
         "published_at",
         "created_at",
     )
+    list_select_related = ("author",)
     date_hierarchy = "published_at"
     prepopulated_fields = {"slug": ("title",)}
     search_fields = ("title", "content")
     list_filter = ("published_at", "created_at", "status", StatusFilter)
+    autocomplete_fields = ("author",)
     inlines = (CommentInline,)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    actions = ("publish", "unpublish", "archive")
+    search_limit = 500
+
+    def get_changelist(self, request, **kwargs):
+        return BlogPostChangeList
+
+    def get_search_results(self, request, queryset, search_term):
+        # Lists the best-ranked search_limit matches, like the site search.
+        if not search_term.strip():
+            return super().get_search_results(request, queryset, search_term)
+        hits = search(search_term, limit=self.search_limit, kinds=(POST,))
+        if len(hits) >= self.search_limit:
+            self.message_user(
+                request,
+                f"Showing the {self.search_limit} best matches only; refine the "
+                f"search to see the rest.",
+                messages.WARNING,
+            )
+        return queryset.filter(pk__in=[uuid.UUID(hit.post_id) for hit in hits]), False
 
     def author_name(self, obj):
         return obj.author.full_name if obj.author else "Anonymous"
 
     author_name.short_description = "Author name"
+    author_name.admin_order_field = "author__first_name"
 
     def short_content(self, obj):
-        return obj.content[:75] + "..." if len(obj.content) > 75 else obj.content
+        content = obj.content_preview
+        return content[:75] + "..." if len(content) > 75 else content
 
     short_content.short_description = "Content"
 
     def comment_count(self, obj):
-        return obj.comments.count()
+        return obj.comment_count
 
     comment_count.short_description = "Comments"
+    comment_count.admin_order_field = "comment_count"
+
+    # Each action is a single UPDATE; see blogs.scheduling.
+
+    @admin.action(description="Publish selected posts")
+    def publish(self, request, queryset):
+        count = publish_posts(queryset.order_by())
+        self.message_user(request, f"Published {count} posts.")
+
+    @admin.action(description="Turn selected posts into drafts")
+    def unpublish(self, request, queryset):
+        count = unpublish_posts(queryset.order_by())
+        self.message_user(request, f"Turned {count} posts into drafts.")
+
+    @admin.action(description="Archive selected posts")
+    def archive(self, request, queryset):
+        count = archive_posts(queryset.order_by())
+        self.message_user(request, f"Archived {count} posts.")
 
 
 @admin.register(Comment)
 class CommentAdmin(admin.ModelAdmin):
+    # No author filter or date hierarchy: both list distinct values of the
+    # whole comments table on every page load.
     list_display = ("author", "content", "parent", "created_at")
-    date_hierarchy = "created_at"
-    search_fields = ("content",)
-    list_filter = ("author",)
+    list_select_related = ("author", "parent__author")
+    search_fields = ("content", "=author__email")
+    autocomplete_fields = ("author", "post")
+    raw_id_fields = ("parent",)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 @admin.register(Author)
 class AuthorAdmin(admin.ModelAdmin):
+    # No date hierarchy: it lists the distinct dates of the whole table on
+    # every page load.
     list_display = ("first_name", "last_name", "full_name", "user", "email")
-    date_hierarchy = "created_at"
-    search_fields = ("first_name", "last_name", "full_name", "email")
-    list_filter = ("email",)
+    list_select_related = ("user",)
+    # full_name is a property; searching first and last names covers it.
+    search_fields = ("first_name", "last_name", "email")
+    raw_id_fields = ("user",)
+
+
+@admin.register(OutboxEmail)
+class OutboxEmailAdmin(admin.ModelAdmin):
+    list_display = ("subject", "status", "attempts", "next_attempt_at", "sent_at")
+    list_filter = ("status",)
+    search_fields = ("subject",)
+    readonly_fields = ("dedupe_key", "claim", "last_error", "sent_at")
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
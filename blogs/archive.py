@@ -0,0 +1,88 @@
+from datetime import date, datetime, time
+
+from django.db import connection, transaction
+from django.db.models import Count, DateField, F
+from django.db.models.functions import Greatest, TruncMonth
+from django.utils import timezone
+
+from . import fragments
+from .models import ArchiveMonth, BlogPost
+
+
+def published_posts():
+    # A range scan on the (is_published, published_at) index. SQLite cannot
+    # use an index for the bare "is_published" that is_published=True
+    # compiles to, but can for IN.
+    return BlogPost.objects.filter(is_published__in=[True])
+
+
+def month_range(year, month=None):
+    """
+    The [start, end) datetimes of a year, or of one month of it. Raises
+    ValueError for dates that do not exist.
+    """
+    if month is None:
+        first, last = date(year, 1, 1), date(year + 1, 1, 1)
+    elif month == 12:
+        first, last = date(year, 12, 1), date(year + 1, 1, 1)
+    else:
+        first, last = date(year, month, 1), date(year, month + 1, 1)
+    return tuple(
+        timezone.make_aware(datetime.combine(day, time())) for day in (first, last)
+    )
+
+
+def adjust(deltas):
+    """
+    Add ``deltas`` (post counts per month, the months as first days) to the
+    rollup, with one statement per month.
+    """
+    deltas = {month: delta for month, delta in deltas.items() if month and delta}
+    if not deltas:
+        return
+    table = ArchiveMonth._meta.db_table
+    field = ArchiveMonth._meta.get_field("month")
+    with connection.cursor() as cursor:
+        for month, delta in deltas.items():
+            if delta > 0:
+                cursor.execute(
+                    f"INSERT INTO {table} (month, post_count) VALUES (%s, %s) "
+                    f"ON CONFLICT (month) DO UPDATE "
+                    f"SET post_count = {table}.post_count + excluded.post_count",
+                    [field.get_db_prep_value(month, connection), delta],
+                )
+            else:
+                ArchiveMonth.objects.filter(month=month).update(
+                    post_count=Greatest(F("post_count") + delta, 0)
+                )
+    fragments.bump(fragments.ARCHIVE_SCOPE)
+
+
+def month_counts(posts):
+    """Published posts per month in ``posts``, as {first day: count}."""
+    return {
+        row["month"]: row["total"]
+        for row in posts.annotate(
+            month=TruncMonth("published_at", output_field=DateField())
+        )
+        .values("month")
+        .order_by()
+        .annotate(total=Count("pk"))
+    }
+
+
+def rebuild():
+    """Recompute the rollup from the posts table. Returns the number of months."""
+    counts = month_counts(published_posts().exclude(published_at=None))
+    with transaction.atomic():
+        ArchiveMonth.objects.all().delete()
+        ArchiveMonth.objects.bulk_create(
+            ArchiveMonth(month=month, post_count=total)
+            for month, total in counts.items()
+        )
+    fragments.bump(fragments.ARCHIVE_SCOPE)
+    return len(counts)
+
+
+def months():
+    return ArchiveMonth.objects.filter(post_count__gt=0).order_by("-month")
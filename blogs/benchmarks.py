@@ -0,0 +1,298 @@
+import asyncio
+import io
+import math
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+from collections import namedtuple
+from contextlib import ExitStack, contextmanager
+
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connections
+from django.test import override_settings
+from django.test.utils import (
+    CaptureQueriesContext,
+    setup_databases,
+    setup_test_environment,
+    teardown_databases,
+    teardown_test_environment,
+)
+from django.urls import reverse
+from PIL import Image
+
+from . import popularity
+
+Scenario = namedtuple("Scenario", "name method url data expected_status")
+Result = namedtuple(
+    "Result", "name requests p50 p90 p99 mean queries max_queries peak_kib"
+)
+LoadResult = namedtuple("LoadResult", "name requests rps p50 p90 p99 errors")
+
+
+@contextmanager
+def benchmark_database():
+    """
+    Run the block against a throwaway SQLite file and media directory.
+
+    A file database rather than the in-memory test default, so WAL, locking
+    and the page cache behave as they do in production, and so server
+    processes started inside the block can open it too. Yields the path.
+    """
+    workdir = tempfile.mkdtemp(prefix="inkwell-bench-")
+    name = os.path.join(workdir, "benchmark.sqlite3")
+    connections["default"].settings_dict["TEST"]["NAME"] = name
+    setup_test_environment()
+    try:
+        with override_settings(
+            MEDIA_ROOT=os.path.join(workdir, "media"), IMAGE_DERIVATIVES_SYNC=True
+        ):
+            old_config = setup_databases(verbosity=0, interactive=False)
+            try:
+                yield name
+            finally:
+                # Write the benchmark's page views before the database goes
+                # away, so the counter never flushes them into the real one.
+                popularity.close_counter()
+                teardown_databases(old_config, verbosity=0)
+    finally:
+        teardown_test_environment()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+@contextmanager
+def capture_queries(aliases=None):
+    """
+    Capture the queries run on ``aliases``, by default every database alias.
+
+    Yields a list of ``CaptureQueriesContext``; ``sum(map(len, ...))`` is the
+    total however reads and writes were routed.
+    """
+    with ExitStack() as stack:
+        yield [
+            stack.enter_context(CaptureQueriesContext(connections[alias]))
+            for alias in aliases or connections
+        ]
+
+
+def query_count(captured):
+    return sum(len(context) for context in captured)
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    index = max(0, math.ceil(fraction * len(ordered)) - 1)
+    return ordered[min(index, len(ordered) - 1)]
+
+
+def upload_image(name="upload.png"):
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 48), "steelblue").save(buffer, "PNG")
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/png")
+
+
+def default_scenarios(author, posts):
+    """
+    The endpoints benchmarked by default, cycling through ``posts``.
+
+    ``author`` is the logged-in writer; edits only touch their own posts so
+    every request passes the permission check.
+    """
+    slugs = [post.slug for post in posts]
+    own = [post.slug for post in posts if post.author_id == author.pk] or slugs[:1]
+    return [
+        Scenario("list", "get", lambda i: reverse("blogs:blog_list"), None, 200),
+        Scenario(
+            "detail",
+            "get",
+            lambda i: reverse("blogs:blog_detail", args=[slugs[i % len(slugs)]]),
+            None,
+            200,
+        ),
+        Scenario(
+            "comment_post",
+            "post",
+            lambda i: reverse("blogs:blog_detail", args=[slugs[i % len(slugs)]]),
+            lambda i: {"content": f"Benchmark comment {i}"},
+            302,
+        ),
+        Scenario(
+            "create",
+            "post",
+            lambda i: reverse("blogs:blog_create"),
+            lambda i: {
+                "title": f"Benchmark post {i}",
+                "content": "Benchmark content. " * 50,
+                "image": upload_image(),
+                "is_published": "on",
+                "published_at": "2024-01-01",
+            },
+            302,
+        ),
+        Scenario(
+            "edit",
+            "post",
+            lambda i: reverse("blogs:blog_edit", args=[own[i % len(own)]]),
+            lambda i: {
+                "title": f"Benchmark edit {i}",
+                "content": "Edited benchmark content. " * 50,
+                "is_published": "on",
+                "published_at": "2024-01-01",
+            },
+            302,
+        ),
+    ]
+
+
+def _request(client, scenario, i):
+    data = scenario.data(i) if scenario.data else None
+    response = getattr(client, scenario.method)(scenario.url(i), data)
+    if response.status_code != scenario.expected_status:
+        raise AssertionError(
+            f"{scenario.name} request {i} returned {response.status_code}, "
+            f"expected {scenario.expected_status}"
+        )
+    return response
+
+
+def run_scenario(client, scenario, iterations=50, warmup=5, cold=False):
+    """
+    Time ``iterations`` requests of one scenario through the test client.
+
+    Latencies are wall-clock milliseconds. Peak memory is measured in a
+    separate, shorter pass because tracemalloc slows every allocation down.
+    ``cold`` clears the cache before each request to time full renders.
+    """
+    counter = 0
+
+    def request():
+        nonlocal counter
+        if cold:
+            caches["default"].clear()
+        counter += 1
+        return _request(client, scenario, counter)
+
+    for _ in range(warmup):
+        request()
+
+    latencies, queries = [], []
+    for _ in range(iterations):
+        with capture_queries() as captured:
+            start = time.perf_counter()
+            request()
+            latencies.append((time.perf_counter() - start) * 1000)
+        queries.append(query_count(captured))
+
+    peak = 0
+    tracemalloc.start()
+    try:
+        for _ in range(min(iterations, 5)):
+            baseline = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            request()
+            peak = max(peak, tracemalloc.get_traced_memory()[1] - baseline)
+    finally:
+        tracemalloc.stop()
+
+    return Result(
+        name=scenario.name,
+        requests=iterations,
+        p50=percentile(latencies, 0.50),
+        p90=percentile(latencies, 0.90),
+        p99=percentile(latencies, 0.99),
+        mean=sum(latencies) / len(latencies),
+        queries=sum(queries) / len(queries),
+        max_queries=max(queries),
+        peak_kib=peak / 1024,
+    )
+
+
+def run_benchmarks(client, scenarios, **options):
+    return [run_scenario(client, scenario, **options) for scenario in scenarios]
+
+
+async def _read_response(reader):
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("Server closed the connection.")
+    status = int(status_line.split()[1])
+    headers = {}
+    while (line := await reader.readline()) not in (b"\r\n", b""):
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    if "content-length" in headers:
+        await reader.readexactly(int(headers["content-length"]))
+    elif headers.get("transfer-encoding") == "chunked":
+        while size := int((await reader.readline()).split(b";")[0], 16):
+            await reader.readexactly(size + 2)
+        await reader.readline()
+    return status, headers.get("connection", "").lower() != "close"
+
+
+async def _load_worker(host, port, requests, deadline, latencies, errors):
+    reader = writer = None
+    number = 0
+    while time.perf_counter() < deadline:
+        if writer is None:
+            reader, writer = await asyncio.open_connection(host, port)
+        request = requests[number % len(requests)]
+        number += 1
+        start = time.perf_counter()
+        try:
+            writer.write(request)
+            await writer.drain()
+            status, keep_alive = await _read_response(reader)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            errors.append(None)
+            writer.close()
+            writer = None
+            continue
+        latencies.append((time.perf_counter() - start) * 1000)
+        if status != 200:
+            errors.append(status)
+        if not keep_alive:
+            writer.close()
+            writer = None
+    if writer is not None:
+        writer.close()
+
+
+def run_load(name, host, port, paths, cookies="", concurrency=16, duration=10):
+    """
+    Drive ``paths`` round-robin from ``concurrency`` keep-alive connections
+    for ``duration`` seconds and return throughput and latency percentiles.
+    """
+    requests = [
+        (
+            f"GET {path} HTTP/1.1\r\nHost: {host}:{port}\r\n"
+            f"Cookie: {cookies}\r\nConnection: keep-alive\r\n\r\n"
+        ).encode()
+        for path in paths
+    ]
+    latencies, errors = [], []
+
+    async def main():
+        deadline = time.perf_counter() + duration
+        await asyncio.gather(
+            *(
+                _load_worker(
+                    host, port, requests[i:] + requests[:i], deadline, latencies, errors
+                )
+                for i in range(concurrency)
+            )
+        )
+
+    start = time.perf_counter()
+    asyncio.run(main())
+    elapsed = time.perf_counter() - start
+    return LoadResult(
+        name=name,
+        requests=len(latencies),
+        rps=len(latencies) / elapsed,
+        p50=percentile(latencies, 0.50) if latencies else 0,
+        p90=percentile(latencies, 0.90) if latencies else 0,
+        p99=percentile(latencies, 0.99) if latencies else 0,
+        errors=len(errors),
+    )
@@ -0,0 +1,202 @@
+import atexit
+import logging
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import (
+    DatabaseError,
+    IntegrityError,
+    close_old_connections,
+    connections,
+    transaction,
+)
+from django.db.models import F
+
+from . import fragments, search, stats
+from .models import BlogPost, Comment
+
+logger = logging.getLogger(__name__)
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def write_comments(comments):
+    """
+    Insert ``comments`` with one bulk_create() and apply what their save
+    signals would have: post counters, author stats, the search index and the
+    fragment cache, with one UPDATE per post and per author.
+    """
+    if not comments:
+        return
+    per_post = defaultdict(lambda: [0, 0])
+    with transaction.atomic():
+        Comment.objects.bulk_create(comments)
+        written = {}
+        for comment in comments:
+            per_post[comment.post_id][0] += 1
+            per_post[comment.post_id][1] += bool(comment.parent_id)
+            count, latest = written.get(comment.author_id, (0, comment.created_at))
+            written[comment.author_id] = (count + 1, max(latest, comment.created_at))
+        for post_id, (total, replies) in per_post.items():
+            counters = {"comment_count": F("comment_count") + total}
+            if replies:
+                counters["reply_count"] = F("reply_count") + replies
+            BlogPost.objects.filter(pk=post_id).update(**counters)
+            stats.adjust_post_author(post_id, comments_received=total)
+        for author_id, (count, latest) in written.items():
+            stats.adjust(author_id, when=latest, comments_written=count)
+        search.index_comments(comments)
+    fragments.bump(
+        *(fragments.comments_scope(post_id) for post_id in per_post),
+        fragments.LIST_SCOPE,
+    )
+
+
+class CommentBuffer:
+    """
+    Write-behind buffer for new comments.
+
+    add() queues a comment and returns at once. A background thread writes
+    the queue with write_comments() once ``max_size`` comments are waiting,
+    or ``interval`` seconds after the oldest was queued, so a busy post takes
+    SQLite's write lock once per batch rather than once per comment. With
+    ``interval=0`` there is no thread and the add() that fills the buffer
+    writes it. close() writes whatever is left and runs at exit.
+    """
+
+    def __init__(self, max_size=50, interval=1.0):
+        self.max_size = max_size
+        self.interval = interval
+        self.condition = threading.Condition()
+        self.flush_lock = threading.Lock()
+        self.pending = {}
+        self.writing = {}
+        self.oldest = None
+        self.thread = None
+        self.closed = False
+
+    def add(self, comment):
+        with self.condition:
+            if not self.pending:
+                self.oldest = time.monotonic()
+            self.pending[comment.pk] = comment
+            full = len(self.pending) >= self.max_size
+            if self.interval and not self.closed:
+                self._start()
+                self.condition.notify()
+                return
+        if full or self.closed:
+            self.flush()
+
+    def find(self, pk):
+        """Return the queued comment with primary key ``pk``, or None."""
+        try:
+            pk = uuid.UUID(str(pk))
+        except ValueError:
+            return None
+        with self.condition:
+            return self.pending.get(pk) or self.writing.get(pk)
+
+    def flush(self):
+        """Write every queued comment now. Returns how many were written."""
+        # One flush at a time, so batches commit in the order they were taken.
+        with self.flush_lock:
+            with self.condition:
+                batch, self.pending = self.pending, {}
+                self.writing = batch
+            try:
+                return self._write(list(batch.values()))
+            finally:
+                with self.condition:
+                    self.writing = {}
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        if self.thread is not None:
+            self.thread.join()
+        self.flush()
+        with self.condition:
+            if self.pending:
+                logger.error(
+                    "Dropping %d buffered comments at shutdown.", len(self.pending)
+                )
+
+    def _write(self, batch):
+        if not batch:
+            return 0
+        try:
+            write_comments(batch)
+            return len(batch)
+        except IntegrityError:
+            # A post or parent deleted since its comment was queued fails the
+            # whole batch; write the comments one by one to keep the rest.
+            written = 0
+            for comment in batch:
+                try:
+                    write_comments([comment])
+                    written += 1
+                except IntegrityError:
+                    logger.warning("Dropping buffered comment %s", comment.pk)
+            return written
+        except DatabaseError:
+            # Most likely a lock timeout. Queue the batch again, ahead of
+            # anything added meanwhile, for the next flush.
+            logger.exception("Writing %d buffered comments failed", len(batch))
+            with self.condition:
+                self.pending = {
+                    **{comment.pk: comment for comment in batch},
+                    **self.pending,
+                }
+                self.oldest = time.monotonic()
+            return 0
+
+    def _start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(
+                target=self._run, name="comment-buffer", daemon=True
+            )
+            self.thread.start()
+
+    def _due(self):
+        return self.closed or (
+            self.pending
+            and (
+                len(self.pending) >= self.max_size
+                or time.monotonic() - self.oldest >= self.interval
+            )
+        )
+
+    def _run(self):
+        try:
+            while True:
+                with self.condition:
+                    while not self._due():
+                        timeout = None
+                        if self.pending:
+                            timeout = self.oldest + self.interval - time.monotonic()
+                        self.condition.wait(timeout)
+                    if self.closed:
+                        # close() writes the rest on the exiting thread.
+                        return
+                close_old_connections()
+                self.flush()
+        finally:
+            connections.close_all()
+
+
+def get_buffer():
+    global _buffer
+    with _buffer_lock:
+        if _buffer is None:
+            _buffer = CommentBuffer(
+                max_size=getattr(settings, "COMMENT_BUFFER_SIZE", 50),
+                interval=getattr(settings, "COMMENT_BUFFER_INTERVAL", 1.0),
+            )
+            atexit.register(_buffer.close)
+        return _buffer
@@ -0,0 +1,164 @@
+import hashlib
+
+from django.contrib.messages import get_messages
+from django.db.models import Max
+from django.utils.cache import get_conditional_response
+
+from . import fragments
+from .models import BlogPost
+from .pagination import akeyset_paginate, decode_cursor, keyset_paginate
+
+# Pages are validated by ETag alone. They depend on the reader and on the
+# related and trending boxes, which have cache versions but no modification
+# date, so a Last-Modified date would answer 304 for pages that did change.
+# The ETag is computed once per request, however often Django asks for it.
+_CACHE_ATTR = "_blog_etag"
+
+
+def _reader_fingerprint(request):
+    # Pages embed the username and a CSRF token, and flash messages are
+    # consumed by rendering, so ETags differ per reader and none is issued
+    # while messages are pending.
+    return [str(request.user.pk), request.META.get("CSRF_COOKIE", "")]
+
+
+def _etag(parts):
+    raw = "|".join(str(part) for part in parts)
+    return '"%s"' % hashlib.sha1(raw.encode(), usedforsecurity=False).hexdigest()
+
+
+def _has_messages(request):
+    return bool(len(get_messages(request)))
+
+
+def _memoize(request, compute):
+    if not hasattr(request, _CACHE_ATTR):
+        if _has_messages(request):
+            setattr(request, _CACHE_ATTR, None)
+        else:
+            setattr(request, _CACHE_ATTR, compute())
+    return getattr(request, _CACHE_ATTR)
+
+
+async def _amemoize(request, compute):
+    # The session is already loaded by request.auser() at this point, so
+    # reading pending messages does not touch the database.
+    if not hasattr(request, _CACHE_ATTR):
+        if _has_messages(request):
+            setattr(request, _CACHE_ATTR, None)
+        else:
+            setattr(request, _CACHE_ATTR, await compute())
+    return getattr(request, _CACHE_ATTR)
+
+
+def _detail_query(slug):
+    return (
+        BlogPost.objects.filter(slug=slug)
+        .values("pk", "updated_at", "comment_count")
+        .annotate(last_comment=Max("comments__updated_at"))
+    )
+
+
+def _detail_etag(request, row, related_version):
+    if row is None:
+        return None
+    return _etag(
+        [
+            row["pk"],
+            row["updated_at"].isoformat(),
+            row["last_comment"].isoformat() if row["last_comment"] else "",
+            row["comment_count"],
+            # Related posts change when other posts do.
+            related_version,
+            request.GET.get("comments_after", ""),
+            request.GET.get("comments_before", ""),
+            *_reader_fingerprint(request),
+        ]
+    )
+
+
+def _list_query(request):
+    # Re-run the page's keyset range with only the columns the cards depend
+    # on; this walks the same index slice the real query would, without
+    # loading content or rendering anything.
+    return (
+        BlogPost.objects.only("id", "created_at", "updated_at", "comment_count"),
+        decode_cursor(request.GET.get("after", "")),
+        decode_cursor(request.GET.get("before", "")),
+    )
+
+
+def _list_etag(request, page, trending_version):
+    rows = [(post.pk, post.updated_at.isoformat(), post.comment_count) for post in page]
+    return _etag(
+        [
+            rows,
+            # The trending box changes without any post on the page changing.
+            trending_version,
+            page.has_next(),
+            page.has_previous(),
+            request.GET.urlencode(),
+            *_reader_fingerprint(request),
+        ]
+    )
+
+
+def detail_etag(request, slug=None, **kwargs):
+    def compute():
+        versions = fragments.get_versions([fragments.RELATED_SCOPE])
+        return _detail_etag(
+            request, _detail_query(slug).first(), versions[fragments.RELATED_SCOPE]
+        )
+
+    return _memoize(request, compute)
+
+
+def list_etag_func(page_size):
+    def etag(request, *args, **kwargs):
+        def compute():
+            queryset, after, before = _list_query(request)
+            page = keyset_paginate(queryset, page_size(request), after, before)
+            versions = fragments.get_versions([fragments.TRENDING_SCOPE])
+            return _list_etag(request, page, versions[fragments.TRENDING_SCOPE])
+
+        return _memoize(request, compute)
+
+    return etag
+
+
+async def adetail_etag(request, slug):
+    async def compute():
+        versions = await fragments.aget_versions([fragments.RELATED_SCOPE])
+        return _detail_etag(
+            request,
+            await _detail_query(slug).afirst(),
+            versions[fragments.RELATED_SCOPE],
+        )
+
+    return await _amemoize(request, compute)
+
+
+async def alist_etag(request, page_size):
+    async def compute():
+        queryset, after, before = _list_query(request)
+        page = await akeyset_paginate(queryset, page_size, after, before)
+        versions = await fragments.aget_versions([fragments.TRENDING_SCOPE])
+        return _list_etag(request, page, versions[fragments.TRENDING_SCOPE])
+
+    return await _amemoize(request, compute)
+
+
+async def aconditional_response(request, etag, respond):
+    """
+    Async counterpart of the ``condition`` decorator, whose validator
+    functions are always called synchronously.
+
+    ``respond`` is a coroutine function producing the full response when the
+    client's copy is stale.
+    """
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = await respond()
+    if etag and request.method in ("GET", "HEAD"):
+        response.headers.setdefault("ETag", etag)
+    return response
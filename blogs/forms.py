@@ -1,6 +1,6 @@
 from django import forms
 
-from .models import BlogPost, Comment
+from .models import BlogPost, Comment, Status
 
 
 class BlogPostForm(forms.ModelForm):
@@ -25,6 +25,21 @@ class BlogPostForm(forms.ModelForm):
             "is_published": forms.CheckboxInput(attrs={"class": "form-check-input"}),
         }
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Scheduled posts are unpublished until due, but the author asked
+        # for them to be published; unticking the box unschedules them.
+        if self.instance.status == Status.SCHEDULED:
+            self.initial["is_published"] = True
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if not cleaned_data.get("is_published") and (
+            self.instance.status == Status.SCHEDULED
+        ):
+            self.instance.status = Status.DRAFT
+        return cleaned_data
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
@@ -0,0 +1,160 @@
+import hashlib
+import inspect
+import threading
+import uuid
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.safestring import mark_safe
+
+POST_BODY = "post_body"
+COMMENTS = "comments"
+POST_LIST = "post_list"
+TRENDING = "trending"
+ARCHIVE = "archive"
+RELATED = "related"
+
+LIST_SCOPE = "list"
+TRENDING_SCOPE = "trending"
+ARCHIVE_SCOPE = "archive"
+RELATED_SCOPE = "related"
+
+_stats = defaultdict(lambda: {"hits": 0, "misses": 0})
+_stats_lock = threading.Lock()
+
+
+def get_cache():
+    return caches[getattr(settings, "BLOG_CACHE_ALIAS", "default")]
+
+
+def timeout():
+    return getattr(settings, "BLOG_FRAGMENT_CACHE_TIMEOUT", 600)
+
+
+def body_scope(post_id):
+    return f"post:{post_id}:body"
+
+
+def comments_scope(post_id):
+    return f"post:{post_id}:comments"
+
+
+def _version_key(scope):
+    return f"blogs:version:{scope}"
+
+
+def get_versions(scopes):
+    """
+    Return the current version token of every scope.
+
+    Versions are random tokens rather than counters: if a version key is
+    evicted, the replacement token can never match fragments cached under
+    the old one.
+    """
+    cache = get_cache()
+    keys = {scope: _version_key(scope) for scope in scopes}
+    found = cache.get_many(list(keys.values()))
+    versions = {}
+    for scope, key in keys.items():
+        versions[scope] = found.get(key)
+        if versions[scope] is None:
+            versions[scope] = uuid.uuid4().hex
+            cache.add(key, versions[scope], timeout=None)
+            versions[scope] = cache.get(key, versions[scope])
+    return versions
+
+
+async def aget_versions(scopes):
+    cache = get_cache()
+    keys = {scope: _version_key(scope) for scope in scopes}
+    found = await cache.aget_many(list(keys.values()))
+    versions = {}
+    for scope, key in keys.items():
+        versions[scope] = found.get(key)
+        if versions[scope] is None:
+            versions[scope] = uuid.uuid4().hex
+            await cache.aadd(key, versions[scope], timeout=None)
+            versions[scope] = await cache.aget(key, versions[scope])
+    return versions
+
+
+def bump(*scopes):
+    get_cache().set_many(
+        {_version_key(scope): uuid.uuid4().hex for scope in scopes}, timeout=None
+    )
+
+
+def _record(name, hit):
+    with _stats_lock:
+        _stats[name]["hits" if hit else "misses"] += 1
+
+
+def stats():
+    with _stats_lock:
+        return {name: dict(counts) for name, counts in _stats.items()}
+
+
+def _fragment_key(name, scopes, parts, versions):
+    raw = "|".join([name, *(versions[scope] for scope in scopes), *map(str, parts)])
+    digest = hashlib.md5(raw.encode(), usedforsecurity=False).hexdigest()
+    return f"blogs:fragment:{name}:{digest}"
+
+
+def fragment_key(name, scopes, parts=()):
+    return _fragment_key(name, scopes, parts, get_versions(scopes))
+
+
+def get_or_render(name, scopes, parts, render):
+    """
+    Return the cached HTML of a fragment, calling ``render()`` on a miss.
+
+    ``scopes`` are the version scopes whose bump invalidates the fragment;
+    ``parts`` distinguish variants within them (for example a page cursor).
+    Only markup that is identical for every reader may be cached this way.
+    """
+    cache = get_cache()
+    key = fragment_key(name, scopes, parts)
+    html = cache.get(key)
+    _record(name, html is not None)
+    if html is None:
+        html = str(render())
+        cache.set(key, html, timeout())
+    return mark_safe(html)
+
+
+async def aget_or_render(name, scopes, parts, render):
+    """
+    Async counterpart of ``get_or_render``; ``render`` may be a coroutine
+    function.
+    """
+    cache = get_cache()
+    key = _fragment_key(name, scopes, parts, await aget_versions(scopes))
+    html = await cache.aget(key)
+    _record(name, html is not None)
+    if html is None:
+        html = render()
+        if inspect.isawaitable(html):
+            html = await html
+        html = str(html)
+        await cache.aset(key, html, timeout())
+    return mark_safe(html)
+
+
+def invalidate_post(post_id):
+    # The trending and related boxes show post titles too.
+    bump(body_scope(post_id), LIST_SCOPE, TRENDING_SCOPE, RELATED_SCOPE)
+
+
+def invalidate_comments(post_id):
+    bump(comments_scope(post_id), LIST_SCOPE)
+
+
+def invalidate_author(post_ids, commented_post_ids):
+    # Usernames are shown on an author's posts, in the list and beside their
+    # comments.
+    bump(
+        LIST_SCOPE,
+        *(body_scope(post_id) for post_id in post_ids),
+        *(comments_scope(post_id) for post_id in commented_post_ids),
+    )
@@ -0,0 +1,139 @@
+import atexit
+import hashlib
+import io
+import logging
+import multiprocessing
+import os
+import posixpath
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import connections
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .fragments import invalidate_post
+
+logger = logging.getLogger(__name__)
+
+DERIVATIVE_WIDTHS = (320, 640, 1024, 1600)
+DERIVATIVE_FORMATS = {
+    "webp": {"format": "WEBP", "quality": 80, "method": 4},
+    "jpeg": {"format": "JPEG", "quality": 82, "optimize": True, "progressive": True},
+}
+DERIVATIVE_DIR = "derivatives"
+# Derivative names carry a digest of their bytes, so a regenerated or
+# re-uploaded image never reuses the name of a file clients may have cached.
+DIGEST_LENGTH = 12
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def render_derivatives(source_path, source_name, widths=DERIVATIVE_WIDTHS):
+    """
+    Write resized WebP and JPEG copies of one image next to the original,
+    named ``<stem>-<width>.<digest>.<extension>``.
+
+    Runs in pool worker processes, so it only touches the filesystem and
+    Pillow. Returns the ``image_variants`` mapping for ``BlogPost``.
+    """
+    stem = os.path.splitext(os.path.basename(source_name))[0]
+    output_dir = os.path.join(os.path.dirname(source_path), DERIVATIVE_DIR)
+    os.makedirs(output_dir, exist_ok=True)
+
+    with Image.open(source_path) as original:
+        image = ImageOps.exif_transpose(original)
+        targets = [width for width in widths if width < image.width] or [image.width]
+        variants = {"source": source_name}
+        for extension, options in DERIVATIVE_FORMATS.items():
+            variants[extension] = []
+            for width in targets:
+                height = max(1, round(image.height * width / image.width))
+                resized = image.resize((width, height), Image.Resampling.LANCZOS)
+                if options["format"] == "JPEG" and resized.mode != "RGB":
+                    resized = resized.convert("RGB")
+                buffer = io.BytesIO()
+                resized.save(buffer, **options)
+                data = buffer.getvalue()
+                digest = hashlib.sha256(data).hexdigest()[:DIGEST_LENGTH]
+                filename = f"{stem}-{width}.{digest}.{extension}"
+                with open(os.path.join(output_dir, filename), "wb") as output:
+                    output.write(data)
+                variants[extension].append(
+                    [
+                        width,
+                        posixpath.join(
+                            posixpath.dirname(source_name), DERIVATIVE_DIR, filename
+                        ),
+                    ]
+                )
+    return variants
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # Web servers run threads; a forked worker would inherit locks
+            # other threads held at the fork, so workers are spawned fresh.
+            _executor = ProcessPoolExecutor(
+                max_workers=getattr(settings, "IMAGE_DERIVATIVE_WORKERS", 2),
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+            atexit.register(_executor.shutdown, wait=True)
+        return _executor
+
+
+def needs_derivatives(post):
+    return (
+        bool(post.image)
+        and (post.image_variants or {}).get("source") != post.image.name
+    )
+
+
+def store_variants(post_id, variants):
+    from .models import BlogPost
+
+    updated = BlogPost.objects.filter(pk=post_id, image=variants["source"]).update(
+        image_variants=variants, updated_at=timezone.now()
+    )
+    if updated:
+        invalidate_post(post_id)
+
+
+def _store_result(post_id, future, caller):
+    try:
+        store_variants(post_id, future.result())
+    except Exception:
+        logger.exception("Generating image derivatives for post %s failed", post_id)
+    finally:
+        # Done callbacks normally run on the pool's management thread, which
+        # must not keep a database connection open.
+        if threading.get_ident() != caller:
+            connections.close_all()
+
+
+def schedule_derivatives(post):
+    """
+    Queue derivative generation for ``post.image`` on the process pool.
+
+    The result is written back to ``image_variants`` only if the post still
+    points at the same image, so a later upload is never overwritten by an
+    older job. Set ``IMAGE_DERIVATIVES_SYNC = True`` to render inline.
+    """
+    try:
+        source_path = default_storage.path(post.image.name)
+    except NotImplementedError:
+        logger.warning("Image derivatives need a filesystem storage backend.")
+        return None
+    args = (source_path, post.image.name)
+    if getattr(settings, "IMAGE_DERIVATIVES_SYNC", False):
+        store_variants(post.pk, render_derivatives(*args))
+        return None
+    future = get_executor().submit(render_derivatives, *args)
+    caller = threading.get_ident()
+    future.add_done_callback(lambda done: _store_result(post.pk, done, caller))
+    return future
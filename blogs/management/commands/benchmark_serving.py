@@ -0,0 +1,175 @@
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.urls import reverse
+
+from blogs.benchmarks import benchmark_database, run_load
+from blogs.models import Author, BlogPost
+from blogs.synthetic import generate
+
+COLUMNS = ("requests", "rps", "p50", "p90", "p99", "errors")
+HOST = "127.0.0.1"
+
+
+def server_command(mode, port, workers, threads):
+    if mode == "wsgi":
+        return [
+            sys.executable,
+            "-m",
+            "gunicorn",
+            "inkwell.wsgi:application",
+            "--worker-class",
+            "gthread",
+            "--workers",
+            str(workers),
+            "--threads",
+            str(threads),
+            "--bind",
+            f"{HOST}:{port}",
+            "--log-level",
+            "warning",
+        ]
+    return [
+        sys.executable,
+        "-m",
+        "uvicorn",
+        "inkwell.asgi:application",
+        "--workers",
+        str(workers),
+        "--host",
+        HOST,
+        "--port",
+        str(port),
+        "--no-access-log",
+        "--log-level",
+        "warning",
+    ]
+
+
+def wait_for_port(port, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise CommandError(f"Server exited with status {process.returncode}.")
+        try:
+            with socket.create_connection((HOST, port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise CommandError(f"Server did not start listening on port {port}.")
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the WSGI and ASGI serving paths under concurrent keep-alive "
+        "load on the list, detail and feed views."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--mode", choices=("wsgi", "asgi", "both"), default="both")
+        parser.add_argument("--concurrency", type=int, default=32)
+        parser.add_argument(
+            "--duration", type=float, default=10, help="Seconds per endpoint."
+        )
+        parser.add_argument("--workers", type=int, default=2)
+        parser.add_argument(
+            "--threads",
+            type=int,
+            default=8,
+            help="Threads per gunicorn worker in WSGI mode.",
+        )
+        parser.add_argument("--port", type=int, default=8765)
+        parser.add_argument("--authors", type=int, default=20)
+        parser.add_argument("--posts", type=int, default=200)
+        parser.add_argument("--comments", type=int, default=20)
+        parser.add_argument("--depth", type=int, default=3)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--json", help="Also write the results to this file.")
+
+    def handle(self, *args, **options):
+        modes = ("wsgi", "asgi") if options["mode"] == "both" else (options["mode"],)
+        results = []
+        with benchmark_database() as name:
+            cookies, endpoints = self.prepare(options)
+            for mode in modes:
+                results.extend(self.serve(mode, name, cookies, endpoints, options))
+
+        self.report(results)
+        if options["json"]:
+            with open(options["json"], "w", encoding="utf-8") as out:
+                json.dump([result._asdict() for result in results], out, indent=2)
+
+    def prepare(self, options):
+        self.stdout.write(
+            f"Generating {options['posts']} posts with {options['comments']} "
+            f"comments each..."
+        )
+        emails = generate(
+            authors=options["authors"],
+            posts=options["posts"],
+            comments=options["comments"],
+            depth=options["depth"],
+            seed=options["seed"],
+        )
+        author = Author.objects.select_related("user").get(email=emails[0])
+        client = Client()
+        client.force_login(author.user)
+        cookie = client.cookies[settings.SESSION_COOKIE_NAME]
+        slugs = BlogPost.publishes.values_list("slug", flat=True)
+        endpoints = {
+            "list": [reverse("blogs:blog_list")],
+            "detail": [reverse("blogs:blog_detail", args=[slug]) for slug in slugs],
+            "feed": [reverse("blogs:blog_feed")],
+        }
+        return f"{cookie.key}={cookie.value}", endpoints
+
+    def serve(self, mode, name, cookies, endpoints, options):
+        env = dict(
+            os.environ,
+            DATABASE_NAME=name,
+            DATABASE_REPLICA_NAME=name,
+            BLOG_ASYNC_VIEWS=str(mode == "asgi"),
+        )
+        process = subprocess.Popen(
+            server_command(
+                mode, options["port"], options["workers"], options["threads"]
+            ),
+            cwd=settings.BASE_DIR,
+            env=env,
+        )
+        try:
+            wait_for_port(options["port"], process)
+            self.stdout.write(f"Loading {mode} server...")
+            return [
+                run_load(
+                    f"{mode} {endpoint}",
+                    HOST,
+                    options["port"],
+                    paths,
+                    cookies=cookies,
+                    concurrency=options["concurrency"],
+                    duration=options["duration"],
+                )
+                for endpoint, paths in endpoints.items()
+            ]
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+
+    def report(self, results):
+        self.stdout.write(
+            f"{'endpoint':<14}" + "".join(f"{column:>12}" for column in COLUMNS)
+        )
+        for result in results:
+            values = result._asdict()
+            self.stdout.write(
+                f"{result.name:<14}"
+                + "".join(f"{values[column]:>12.1f}" for column in COLUMNS)
+            )
@@ -0,0 +1,81 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.test import Client
+
+from blogs.benchmarks import benchmark_database, default_scenarios, run_benchmarks
+from blogs.models import Author, BlogPost
+from blogs.synthetic import generate
+
+COLUMNS = ("p50", "p90", "p99", "mean", "queries", "max_queries", "peak_kib")
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the list, detail, comment, create and edit views against a "
+        "throwaway database filled with synthetic data."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--authors", type=int, default=20)
+        parser.add_argument("--posts", type=int, default=200)
+        parser.add_argument("--comments", type=int, default=20)
+        parser.add_argument("--depth", type=int, default=3)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--iterations", type=int, default=50)
+        parser.add_argument("--warmup", type=int, default=5)
+        parser.add_argument(
+            "--cold",
+            action="store_true",
+            help="Clear the cache before every request.",
+        )
+        parser.add_argument("--only", nargs="+", help="Run only the named scenarios.")
+        parser.add_argument("--json", help="Also write the results to this file.")
+
+    def handle(self, *args, **options):
+        with benchmark_database():
+            results = self.run(options)
+
+        self.report(results)
+        if options["json"]:
+            with open(options["json"], "w", encoding="utf-8") as out:
+                json.dump([result._asdict() for result in results], out, indent=2)
+
+    def run(self, options):
+        self.stdout.write(
+            f"Generating {options['posts']} posts with {options['comments']} "
+            f"comments each..."
+        )
+        emails = generate(
+            authors=options["authors"],
+            posts=options["posts"],
+            comments=options["comments"],
+            depth=options["depth"],
+            seed=options["seed"],
+        )
+        author = Author.objects.select_related("user").get(email=emails[0])
+        posts = list(BlogPost.objects.only("id", "slug", "author_id"))
+        scenarios = default_scenarios(author, posts)
+        if options["only"]:
+            scenarios = [s for s in scenarios if s.name in options["only"]]
+
+        client = Client()
+        client.force_login(author.user)
+        return run_benchmarks(
+            client,
+            scenarios,
+            iterations=options["iterations"],
+            warmup=options["warmup"],
+            cold=options["cold"],
+        )
+
+    def report(self, results):
+        self.stdout.write(
+            f"{'scenario':<14}" + "".join(f"{column:>12}" for column in COLUMNS)
+        )
+        for result in results:
+            values = result._asdict()
+            self.stdout.write(
+                f"{result.name:<14}"
+                + "".join(f"{values[column]:>12.1f}" for column in COLUMNS)
+            )
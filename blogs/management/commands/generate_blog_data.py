@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+
+from blogs.synthetic import generate
+
+
+class Command(BaseCommand):
+    help = (
+        "Create reproducible synthetic authors, posts and threaded comments "
+        "for load testing."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--authors", type=int, default=10)
+        parser.add_argument("--posts", type=int, default=100)
+        parser.add_argument(
+            "--comments", type=int, default=10, help="Comments per post."
+        )
+        parser.add_argument(
+            "--depth", type=int, default=3, help="Maximum reply nesting depth."
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        emails = generate(
+            authors=options["authors"],
+            posts=options["posts"],
+            comments=options["comments"],
+            depth=options["depth"],
+            seed=options["seed"],
+            batch_size=options["batch_size"],
+            stdout=self.stdout,
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Synthetic data ready; log in as any of {len(emails)} authors "
+                f"(e.g. {emails[0].split('@')[0]}) with the password "
+                f"'synthetic-password'."
+            )
+        )
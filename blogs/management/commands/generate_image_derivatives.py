@@ -0,0 +1,45 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from blogs.images import needs_derivatives, render_derivatives, store_variants
+from blogs.models import BlogPost
+
+
+class Command(BaseCommand):
+    help = "Generate responsive WebP/JPEG derivatives for existing post images."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=None)
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Regenerate derivatives even when they are up to date.",
+        )
+
+    def handle(self, *args, **options):
+        posts = BlogPost.objects.exclude(image="").only("id", "image", "image_variants")
+        jobs = [
+            (post.pk, default_storage.path(post.image.name), post.image.name)
+            for post in posts.iterator(chunk_size=500)
+            if options["force"] or needs_derivatives(post)
+        ]
+        self.stdout.write(f"Generating derivatives for {len(jobs)} images.")
+
+        done = failed = 0
+        with ProcessPoolExecutor(max_workers=options["workers"]) as executor:
+            futures = {
+                executor.submit(render_derivatives, path, name): post_id
+                for post_id, path, name in jobs
+            }
+            for future in as_completed(futures):
+                try:
+                    store_variants(futures[future], future.result())
+                    done += 1
+                except Exception as exc:
+                    failed += 1
+                    self.stderr.write(f"Post {futures[future]}: {exc}")
+        self.stdout.write(
+            self.style.SUCCESS(f"Processed {done} images, {failed} failed.")
+        )
@@ -0,0 +1,277 @@
+import json
+import uuid
+from collections import Counter, defaultdict
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from blogs import archive, fragments, stats
+from blogs.models import Author, BlogPost, Comment, Status
+from blogs.search import comment_document, post_document, get_search_backend
+
+
+def bulk_create(model, objs, batch_size):
+    # bulk_create runs pre_save(), which stamps auto_now/auto_now_add fields
+    # with the current time; write the exported timestamps back afterwards.
+    stamps = [(obj.created_at, obj.updated_at) for obj in objs]
+    model.objects.bulk_create(objs, batch_size=batch_size)
+    for obj, (created_at, updated_at) in zip(objs, stamps):
+        obj.created_at, obj.updated_at = created_at, updated_at
+    model.objects.bulk_update(objs, ["created_at", "updated_at"], batch_size)
+
+
+def _datetime(value, default):
+    parsed = parse_datetime(value) if value else None
+    return parsed or default
+
+
+class Command(BaseCommand):
+    help = (
+        "Import posts and comments from JSON Lines (as written by export_blog) "
+        "with chunked bulk_create."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="JSON Lines file to import.")
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--no-rebuild",
+            action="store_true",
+            help="Skip rebuild_related; run it yourself once the last file is in.",
+        )
+
+    def handle(self, *args, **options):
+        self.batch_size = options["batch_size"]
+        self.authors = {}
+        self.comment_paths = {}
+        self.slugs = set()
+        self.stats = {"post": 0, "comment": 0, "skipped": 0}
+        self.search = get_search_backend()
+        self.now = timezone.now()
+        batches = {"post": [], "comment": []}
+
+        with open(options["path"], encoding="utf-8") as source:
+            for number, line in enumerate(source, 1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError as exc:
+                    raise CommandError(f"Line {number}: {exc}")
+                kind = row.get("type")
+                if kind not in batches:
+                    raise CommandError(f"Line {number}: unknown type {kind!r}")
+                if kind == "comment" and batches["post"]:
+                    self.flush_posts(batches["post"])
+                batches[kind].append(row)
+                if len(batches[kind]) >= self.batch_size:
+                    getattr(self, f"flush_{kind}s")(batches[kind])
+            self.flush_posts(batches["post"])
+            self.flush_comments(batches["comment"])
+
+        # Comment counters, author stats and the archive are kept up to date
+        # per batch; related posts are scored against the whole corpus.
+        if options["no_rebuild"]:
+            self.stdout.write("Skipped rebuild_related; run it before serving.")
+        else:
+            call_command("rebuild_related", stdout=self.stdout)
+        fragments.bump(fragments.LIST_SCOPE)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {self.stats['post']} posts and {self.stats['comment']} "
+                f"comments, skipped {self.stats['skipped']} rows. Run "
+                f"generate_image_derivatives to build responsive images."
+            )
+        )
+
+    def resolve_authors(self, rows):
+        emails = {row["author_email"] for row in rows if row.get("author_email")}
+        missing = emails - self.authors.keys()
+        if missing:
+            found = dict(
+                Author.objects.filter(email__in=missing).values_list("email", "pk")
+            )
+            for email in missing:
+                self.authors[email] = found.get(email)
+
+    def new_rows(self, model, rows):
+        ids = [uuid.UUID(row["id"]) if row.get("id") else uuid.uuid4() for row in rows]
+        existing = set(model.objects.filter(pk__in=ids).values_list("pk", flat=True))
+        self.stats["skipped"] += len(existing)
+        return [(pk, row) for pk, row in zip(ids, rows) if pk not in existing]
+
+    def progress(self):
+        self.stdout.write(
+            f"  {self.stats['post']} posts, {self.stats['comment']} comments imported"
+        )
+
+    def flush_posts(self, rows):
+        if not rows:
+            return
+        self.resolve_authors(rows)
+        posts = []
+        for pk, row in self.new_rows(BlogPost, rows):
+            created_at = _datetime(row.get("created_at"), self.now)
+            post = BlogPost(
+                id=pk,
+                title=row["title"],
+                slug=row.get("slug") or "",
+                content=row.get("content", ""),
+                image=row.get("image") or "",
+                author_id=self.authors.get(row.get("author_email")),
+                is_published=row.get("is_published", False),
+                published_at=_datetime(row.get("published_at"), None),
+                status=row.get("status") or Status.DRAFT,
+                created_at=created_at,
+                updated_at=_datetime(row.get("updated_at"), created_at),
+            )
+            post.render()
+            post.sync_publication(self.now)
+            posts.append(post)
+
+        # Exported slugs are kept when free; anything missing or clashing, with
+        # the database or with a slug given out earlier in this import, is
+        # reallocated in memory against one query per chunk of base slugs.
+        taken = set(
+            BlogPost.objects.filter(
+                slug__in=[post.slug for post in posts if post.slug]
+            ).values_list("slug", flat=True)
+        )
+        for post in posts:
+            if post.slug in taken:
+                post.slug = ""
+        BlogPost.assign_unique_slugs(posts, reserved=self.slugs)
+
+        with transaction.atomic():
+            bulk_create(BlogPost, posts, self.batch_size)
+            self.count_posts(posts)
+            self.search.index(post_document(post) for post in posts)
+        self.stats["post"] += len(posts)
+        rows.clear()
+        self.progress()
+
+    def flush_comments(self, rows):
+        if not rows:
+            return
+        self.resolve_authors(rows)
+        parent_ids = {
+            uuid.UUID(row["parent_id"])
+            for row in rows
+            if row.get("parent_id")
+            and uuid.UUID(row["parent_id"]) not in self.comment_paths
+        }
+        if parent_ids:
+            for pk, path, depth, parent_id in Comment.objects.filter(
+                pk__in=parent_ids
+            ).values_list("pk", "path", "depth", "parent_id"):
+                self.comment_paths[pk] = (path, depth, parent_id)
+
+        post_authors = dict(
+            BlogPost.objects.filter(
+                pk__in={uuid.UUID(row["post_id"]) for row in rows}
+            ).values_list("pk", "author_id")
+        )
+
+        comments = []
+        for pk, row in self.new_rows(Comment, rows):
+            if uuid.UUID(row["post_id"]) not in post_authors:
+                self.stderr.write(f"Skipping comment {pk}: unknown post.")
+                self.stats["skipped"] += 1
+                continue
+            created_at = _datetime(row.get("created_at"), self.now)
+            comment = Comment(
+                id=pk,
+                post_id=uuid.UUID(row["post_id"]),
+                parent_id=uuid.UUID(row["parent_id"]) if row.get("parent_id") else None,
+                author_id=self.authors.get(row.get("author_email")),
+                content=row.get("content", ""),
+                created_at=created_at,
+                updated_at=_datetime(row.get("updated_at"), created_at),
+            )
+            segment = Comment.path_segment(created_at, pk)
+            if comment.parent_id:
+                parent = self.comment_paths.get(comment.parent_id)
+                if parent is None:
+                    self.stderr.write(f"Skipping comment {pk}: unknown parent.")
+                    self.stats["skipped"] += 1
+                    continue
+                path, depth, grandparent_id = parent
+                if depth >= Comment.MAX_DEPTH:
+                    # Too deep for the path column; see Comment.assign_path().
+                    comment.parent_id = grandparent_id
+                    path, depth = path.rpartition(Comment.PATH_SEPARATOR)[0], depth - 1
+                comment.path = f"{path}{Comment.PATH_SEPARATOR}{segment}"
+                comment.depth = depth + 1
+            else:
+                comment.path, comment.depth = segment, 0
+            self.comment_paths[pk] = (comment.path, comment.depth, comment.parent_id)
+            comments.append(comment)
+
+        with transaction.atomic():
+            bulk_create(Comment, comments, self.batch_size)
+            self.count_comments(comments, post_authors)
+            self.search.index(comment_document(comment) for comment in comments)
+        self.stats["comment"] += len(comments)
+        rows.clear()
+        self.progress()
+
+    def count_posts(self, posts):
+        """Add a batch of new posts to the author stats and the archive."""
+        by_author = defaultdict(Counter)
+        latest = {}
+        for post in posts:
+            if post.author_id:
+                by_author[post.author_id]["post_count"] += 1
+                by_author[post.author_id]["published_count"] += post.is_published
+                latest[post.author_id] = max(
+                    post.updated_at, latest.get(post.author_id, post.updated_at)
+                )
+        for author_id, deltas in by_author.items():
+            stats.adjust(author_id, latest[author_id], **deltas)
+        archive.adjust(
+            archive.month_counts(
+                archive.published_posts()
+                .filter(pk__in=[post.pk for post in posts])
+                .exclude(published_at=None)
+            )
+        )
+
+    def count_comments(self, comments, post_authors):
+        """Add a batch of new comments to the post counters and author stats."""
+        counts = defaultdict(Counter)
+        for comment in comments:
+            counts[comment.post_id]["comments"] += 1
+            counts[comment.post_id]["replies"] += bool(comment.parent_id)
+        # One UPDATE per distinct (comments, replies) pair rather than per post.
+        posts = defaultdict(list)
+        for post_id, count in counts.items():
+            posts[count["comments"], count["replies"]].append(post_id)
+        for (added, replies), ids in posts.items():
+            BlogPost.objects.filter(pk__in=ids).update(
+                comment_count=F("comment_count") + added,
+                reply_count=F("reply_count") + replies,
+            )
+
+        received = Counter()
+        for post_id, count in counts.items():
+            received[post_authors[post_id]] += count["comments"]
+        written = Counter()
+        latest = {}
+        for comment in comments:
+            if comment.author_id:
+                written[comment.author_id] += 1
+                latest[comment.author_id] = max(
+                    comment.created_at,
+                    latest.get(comment.author_id, comment.created_at),
+                )
+        for author_id in (received.keys() | written.keys()) - {None}:
+            stats.adjust(
+                author_id,
+                latest.get(author_id),
+                comments_received=received[author_id],
+                comments_written=written[author_id],
+            )
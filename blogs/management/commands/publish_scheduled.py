@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils import timezone
+
+from blogs.scheduling import next_due, publish_due
+
+
+class Command(BaseCommand):
+    help = "Publish scheduled posts whose published_at has passed."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep running, sleeping until the next post is due.",
+        )
+        parser.add_argument(
+            "--max-sleep",
+            type=float,
+            default=300.0,
+            help="Longest sleep in seconds, so newly scheduled posts are noticed.",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            while True:
+                now = timezone.now()
+                published = publish_due(now)
+                if published:
+                    self.stdout.write(f"Published {published} scheduled posts.")
+                if not options["loop"]:
+                    break
+                due = next_due(now)
+                delay = options["max_sleep"]
+                if due is not None:
+                    delay = min(delay, (due - timezone.now()).total_seconds())
+                close_old_connections()
+                time.sleep(max(delay, 0))
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS("Scheduled posts published."))
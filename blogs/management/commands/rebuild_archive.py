@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from blogs.archive import rebuild
+
+
+class Command(BaseCommand):
+    help = "Rebuild the archive's per-month post counts from the posts table."
+
+    def handle(self, *args, **options):
+        months = rebuild()
+        self.stdout.write(
+            self.style.SUCCESS(f"Rebuilt post counts for {months} months.")
+        )
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from blogs.related import rebuild
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute every post's TF-IDF terms and related posts, spreading the "
+        "work over worker processes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=None)
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=500,
+            help="Number of posts tokenized or scored per worker task.",
+        )
+
+    def handle(self, *args, **options):
+        posts = rebuild(
+            workers=options["workers"],
+            chunk_size=options["chunk_size"],
+            progress=lambda count: self.stdout.write(f"  {count} posts scored"),
+        )
+        self.stdout.write(
+            self.style.SUCCESS(f"Rebuilt related posts for {posts} posts.")
+        )
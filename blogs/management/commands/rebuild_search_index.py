@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from blogs.search import get_search_backend, rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Reindex all posts and comments into the full-text search index."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=500,
+            help="Number of documents indexed per transaction.",
+        )
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        self.stdout.write(f"Rebuilding search index with {type(backend).__name__}.")
+        indexed = rebuild_index(
+            backend,
+            chunk_size=options["chunk_size"],
+            progress=lambda count: self.stdout.write(f"  {count} documents indexed"),
+        )
+        self.stdout.write(self.style.SUCCESS(f"Indexed {indexed} documents."))
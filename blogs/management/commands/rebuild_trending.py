@@ -0,0 +1,40 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from blogs.popularity import rebuild_scores
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute trending scores from the post view buckets, optionally "
+        "deleting old buckets first."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--prune-days",
+            type=int,
+            default=None,
+            help="Delete view buckets older than this many days first.",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=500,
+            help="Number of posts scored per round of queries.",
+        )
+
+    def handle(self, *args, **options):
+        since = None
+        if options["prune_days"] is not None:
+            since = timezone.now() - timedelta(days=options["prune_days"])
+        scored = rebuild_scores(
+            since=since,
+            chunk_size=options["chunk_size"],
+            progress=lambda count: self.stdout.write(f"  {count} posts scored"),
+        )
+        self.stdout.write(
+            self.style.SUCCESS(f"Rebuilt trending scores for {scored} posts.")
+        )
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from blogs.stats import rebuild
+
+
+class Command(BaseCommand):
+    help = "Rebuild every author's stats from the posts and comments tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=500,
+            help="Number of authors rebuilt per round of queries.",
+        )
+
+    def handle(self, *args, **options):
+        rebuilt = rebuild(
+            chunk_size=options["chunk_size"],
+            progress=lambda count: self.stdout.write(f"  {count} authors rebuilt"),
+        )
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt stats for {rebuilt} authors."))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from blogs.models import BlogPost, Comment
+
+
+def _count_subquery(comments):
+    counts = (
+        comments.filter(post=OuterRef("pk"))
+        .order_by()
+        .values("post")
+        .annotate(total=Count("pk"))
+        .values("total")
+    )
+    return Coalesce(Subquery(counts, output_field=IntegerField()), Value(0))
+
+
+class Command(BaseCommand):
+    help = "Recompute BlogPost.comment_count and reply_count in a single UPDATE."
+
+    def handle(self, *args, **options):
+        updated = BlogPost.objects.update(
+            comment_count=_count_subquery(Comment.objects.all()),
+            reply_count=_count_subquery(Comment.objects.filter(parent__isnull=False)),
+        )
+        self.stdout.write(
+            self.style.SUCCESS(f"Recounted comments for {updated} posts.")
+        )
@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from blogs import fragments
+from blogs.models import BlogPost
+from blogs.rendering import RENDERED_FIELDS, RENDERER_VERSION
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-render the stored HTML, excerpt and reading time of posts rendered "
+        "by an older renderer version."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Re-render every post, not only outdated ones.",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=500,
+            help="Number of posts rendered per transaction.",
+        )
+
+    def handle(self, *args, **options):
+        posts = BlogPost.objects.only("id", "content", *RENDERED_FIELDS).order_by("pk")
+        if not options["all"]:
+            posts = posts.exclude(renderer_version=RENDERER_VERSION)
+
+        rendered = 0
+        last_pk = None
+        while True:
+            chunk = posts.filter(pk__gt=last_pk) if last_pk else posts
+            chunk = list(chunk[: options["chunk_size"]])
+            if not chunk:
+                break
+            now = timezone.now()
+            for post in chunk:
+                post.render(force=True)
+                # Pages are revalidated against updated_at.
+                post.updated_at = now
+            with transaction.atomic():
+                BlogPost.objects.bulk_update(chunk, [*RENDERED_FIELDS, "updated_at"])
+            # bulk_update skips the save signals that invalidate fragments.
+            fragments.bump(*(fragments.body_scope(post.pk) for post in chunk))
+            rendered += len(chunk)
+            last_pk = chunk[-1].pk
+            self.stdout.write(f"  {rendered} posts rendered")
+
+        if rendered:
+            fragments.bump(fragments.LIST_SCOPE)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Rendered {rendered} posts with renderer version {RENDERER_VERSION}."
+            )
+        )
@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from blogs.outbox import release_stale_claims, send_batch
+
+
+class Command(BaseCommand):
+    help = "Send queued emails from the outbox, one SMTP connection per batch."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100)
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep running and poll for new emails every --interval seconds.",
+        )
+        parser.add_argument("--interval", type=float, default=5.0)
+
+    def drain(self, batch_size):
+        total_sent = total_failed = 0
+        while True:
+            sent, failed = send_batch(batch_size)
+            total_sent += sent
+            total_failed += failed
+            if sent + failed < batch_size:
+                return total_sent, total_failed
+
+    def handle(self, *args, **options):
+        released = release_stale_claims()
+        if released:
+            self.stdout.write(f"Released {released} stale claims.")
+        try:
+            while True:
+                sent, failed = self.drain(options["batch_size"])
+                if sent or failed:
+                    self.stdout.write(f"Sent {sent} emails, {failed} failed.")
+                if not options["loop"]:
+                    break
+                time.sleep(options["interval"])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS("Outbox drained."))
@@ -0,0 +1,89 @@
+import socketserver
+
+from django.core.management.base import BaseCommand
+
+
+class SinkHandler(socketserver.StreamRequestHandler):
+    """
+    Just enough SMTP to accept and print messages from Django's SMTP backend.
+
+    Authentication is accepted without checking, STARTTLS is not offered, so
+    run the worker with ``EMAIL_USE_TLS=False`` against it.
+    """
+
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        self.server.connections += 1
+        self.reply("220 inkwell smtp sink")
+        envelope = []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode(errors="replace").strip()
+            verb = command.split(" ", 1)[0].upper()
+            if verb == "EHLO":
+                self.reply("250-inkwell")
+                self.reply("250 AUTH PLAIN")
+            elif verb in ("HELO", "NOOP"):
+                self.reply("250 OK")
+            elif verb == "RSET":
+                envelope = []
+                self.reply("250 OK")
+            elif verb == "AUTH":
+                self.reply("235 Authentication successful")
+            elif verb in ("MAIL", "RCPT"):
+                envelope.append(command)
+                self.reply("250 OK")
+            elif verb == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                body = []
+                for data in self.rfile:
+                    if data in (b".\r\n", b".\n"):
+                        break
+                    body.append(data.decode(errors="replace"))
+                self.server.messages += 1
+                self.server.stdout.write("\n".join(envelope))
+                self.server.stdout.write("".join(body))
+                envelope = []
+                self.reply("250 OK: queued")
+            elif verb == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+
+class SinkServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, address, stdout):
+        super().__init__(address, SinkHandler)
+        self.stdout = stdout
+        self.connections = 0
+        self.messages = 0
+
+
+class Command(BaseCommand):
+    help = "Run a local SMTP server that prints every message it receives."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=1025)
+
+    def handle(self, *args, **options):
+        server = SinkServer((options["host"], options["port"]), self.stdout)
+        self.stdout.write(f"SMTP sink listening on {options['host']}:{options['port']}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            self.stdout.write(
+                f"Received {server.messages} messages over "
+                f"{server.connections} connections."
+            )
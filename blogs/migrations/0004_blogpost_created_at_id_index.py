@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-18 17:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blogs', '0003_alter_blogpost_status'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='blogpost',
+            index=models.Index(fields=['created_at', 'id'], name='blogs_blogp_created_fdccca_idx'),
+        ),
+    ]
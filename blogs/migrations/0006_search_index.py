@@ -0,0 +1,48 @@
+from django.db import migrations
+
+CREATE_STATEMENTS = [
+    "CREATE TABLE IF NOT EXISTS blogs_search_doc ("
+    "id INTEGER PRIMARY KEY, "
+    "doc_id TEXT NOT NULL UNIQUE, "
+    "kind TEXT NOT NULL, "
+    "post_id TEXT NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS blogs_search_doc_post_id ON blogs_search_doc (post_id)",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS blogs_search_fts "
+    "USING fts5(title, body, tokenize='porter unicode61 remove_diacritics 2')",
+]
+
+DROP_STATEMENTS = [
+    "DROP TABLE IF EXISTS blogs_search_fts",
+    "DROP TABLE IF EXISTS blogs_search_doc",
+]
+
+
+def _has_fts5(schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return False
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("PRAGMA compile_options")
+        return any(row[0] == "ENABLE_FTS5" for row in cursor.fetchall())
+
+
+def create_search_tables(apps, schema_editor):
+    if _has_fts5(schema_editor):
+        for statement in CREATE_STATEMENTS:
+            schema_editor.execute(statement)
+
+
+def drop_search_tables(apps, schema_editor):
+    if schema_editor.connection.vendor == "sqlite":
+        for statement in DROP_STATEMENTS:
+            schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("blogs", "0005_blogpost_comment_counters"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_tables, drop_search_tables),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.4 on 2026-10-18 17:41
+
+from django.db import migrations, models
+
+
+def backfill_paths(apps, schema_editor):
+    Comment = apps.get_model("blogs", "Comment")
+    comments = {
+        comment.pk: comment
+        for comment in Comment.objects.only(
+            "id", "parent_id", "created_at", "path", "depth"
+        )
+    }
+
+    def resolve(comment):
+        if comment.path:
+            return
+        segment = (
+            f"{int(comment.created_at.timestamp() * 1_000_000):014x}{comment.pk.hex[:6]}"
+        )
+        parent = comments.get(comment.parent_id)
+        if parent is None:
+            comment.path, comment.depth = segment, 0
+        else:
+            resolve(parent)
+            comment.path = f"{parent.path}/{segment}"
+            comment.depth = parent.depth + 1
+
+    for comment in comments.values():
+        resolve(comment)
+    Comment.objects.bulk_update(comments.values(), ["path", "depth"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blogs', '0008_blogpost_image_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='path',
+            field=models.CharField(blank=True, editable=False, max_length=1000),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'depth', 'created_at', 'id'], name='blogs_comme_post_id_abe8ed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['path'], name='blogs_comme_path_f4209b_idx'),
+        ),
+        migrations.RunPython(backfill_paths, migrations.RunPython.noop),
+    ]
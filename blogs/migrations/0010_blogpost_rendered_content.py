@@ -0,0 +1,63 @@
+# Generated by Django 5.2.4 on 2026-10-18 18:05
+
+import math
+
+from django.db import migrations, models
+from django.utils.html import linebreaks
+
+
+def render_posts(apps, schema_editor):
+    # Renderer version 1, frozen here; later versions are applied with
+    # ``manage.py render_posts``.
+    BlogPost = apps.get_model("blogs", "BlogPost")
+    posts = list(BlogPost.objects.only("id", "content"))
+    for post in posts:
+        text = " ".join(post.content.split())
+        post.content_html = linebreaks(post.content, autoescape=True)
+        post.excerpt = (
+            text if len(text) <= 250 else text[:247].rsplit(" ", 1)[0] + "..."
+        )
+        post.word_count = len(post.content.split())
+        post.reading_time = math.ceil(post.word_count / 200)
+        post.renderer_version = 1
+    BlogPost.objects.bulk_update(
+        posts,
+        ["content_html", "excerpt", "word_count", "reading_time", "renderer_version"],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blogs', '0009_comment_materialized_path'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blogpost',
+            name='content_html',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='blogpost',
+            name='reading_time',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='blogpost',
+            name='renderer_version',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='blogpost',
+            name='word_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='blogpost',
+            name='excerpt',
+            field=models.CharField(blank=True, editable=False, max_length=500, null=True),
+        ),
+        migrations.RunPython(render_posts, migrations.RunPython.noop),
+    ]
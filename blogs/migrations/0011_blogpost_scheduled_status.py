@@ -0,0 +1,34 @@
+# Generated by Django 5.2.4 on 2026-10-18 18:07
+
+from django.db import migrations, models
+from django.db.models import F, Q
+from django.utils import timezone
+
+
+def reconcile_status(apps, schema_editor):
+    # Same rules as BlogPost.sync_publication(): anything meant to be
+    # published is published or scheduled by its date, the rest are drafts.
+    BlogPost = apps.get_model("blogs", "BlogPost")
+    now = timezone.now()
+    live = BlogPost.objects.exclude(status="archived")
+    meant = live.filter(Q(is_published=True) | Q(status="published"))
+    meant.filter(published_at__isnull=True).update(published_at=F("created_at"))
+    meant.filter(published_at__lte=now).update(is_published=True, status="published")
+    meant.filter(published_at__gt=now).update(is_published=False, status="scheduled")
+    live.filter(is_published=False).exclude(status="scheduled").update(status="draft")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blogs', '0010_blogpost_rendered_content'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='blogpost',
+            name='status',
+            field=models.CharField(choices=[('draft', 'Draft'), ('published', 'Published'), ('scheduled', 'Scheduled'), ('archived', 'Archived')], default='draft', max_length=20),
+        ),
+        migrations.RunPython(reconcile_status, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,84 @@
+# Generated by Django 5.2.4 on 2026-10-18 18:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Max, Q
+
+
+def backfill_stats(apps, schema_editor):
+    Author = apps.get_model("blogs", "Author")
+    AuthorStats = apps.get_model("blogs", "AuthorStats")
+    BlogPost = apps.get_model("blogs", "BlogPost")
+    Comment = apps.get_model("blogs", "Comment")
+    stats = {
+        pk: AuthorStats(author_id=pk)
+        for pk in Author.objects.values_list("pk", flat=True)
+    }
+
+    def seen(item, when):
+        if when and (not item.last_activity_at or when > item.last_activity_at):
+            item.last_activity_at = when
+
+    for row in (
+        BlogPost.objects.filter(author__isnull=False)
+        .values("author")
+        .order_by()
+        .annotate(
+            total=Count("pk"),
+            published=Count("pk", filter=Q(is_published=True)),
+            latest=Max("updated_at"),
+        )
+    ):
+        stats[row["author"]].post_count = row["total"]
+        stats[row["author"]].published_count = row["published"]
+        seen(stats[row["author"]], row["latest"])
+    for row in (
+        Comment.objects.filter(post__author__isnull=False)
+        .values("post__author")
+        .order_by()
+        .annotate(total=Count("pk"))
+    ):
+        stats[row["post__author"]].comments_received = row["total"]
+    for row in (
+        Comment.objects.filter(author__isnull=False)
+        .values("author")
+        .order_by()
+        .annotate(total=Count("pk"), latest=Max("created_at"))
+    ):
+        stats[row["author"]].comments_written = row["total"]
+        seen(stats[row["author"]], row["latest"])
+    AuthorStats.objects.bulk_create(stats.values(), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("blogs", "0011_blogpost_scheduled_status"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AuthorStats",
+            fields=[
+                (
+                    "author",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="stats",
+                        serialize=False,
+                        to="blogs.author",
+                    ),
+                ),
+                ("post_count", models.PositiveIntegerField(default=0)),
+                ("published_count", models.PositiveIntegerField(default=0)),
+                ("comments_received", models.PositiveIntegerField(default=0)),
+                ("comments_written", models.PositiveIntegerField(default=0)),
+                ("last_activity_at", models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                "verbose_name_plural": "author stats",
+            },
+        ),
+        migrations.RunPython(backfill_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.4 on 2026-10-18 18:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blogs', '0012_authorstats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrendingScore',
+            fields=[
+                ('post', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='trending', serialize=False, to='blogs.blogpost')),
+                ('score', models.FloatField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-score'], name='blogs_trend_score_18f615_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='PostViewBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.DateTimeField()),
+                ('views', models.PositiveIntegerField(default=0)),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='view_buckets', to='blogs.blogpost')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['bucket'], name='blogs_postv_bucket_54103d_idx')],
+                'constraints': [models.UniqueConstraint(fields=('post', 'bucket'), name='unique_post_view_bucket')],
+            },
+        ),
+    ]
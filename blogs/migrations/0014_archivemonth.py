@@ -0,0 +1,42 @@
+# Generated by Django 5.2.4 on 2026-10-18 18:22
+
+from django.db import migrations, models
+from django.db.models import Count, DateField
+from django.db.models.functions import TruncMonth
+
+
+def backfill_months(apps, schema_editor):
+    ArchiveMonth = apps.get_model("blogs", "ArchiveMonth")
+    BlogPost = apps.get_model("blogs", "BlogPost")
+    rows = (
+        BlogPost.objects.filter(is_published=True, published_at__isnull=False)
+        .annotate(month=TruncMonth("published_at", output_field=DateField()))
+        .values("month")
+        .order_by()
+        .annotate(total=Count("pk"))
+    )
+    ArchiveMonth.objects.bulk_create(
+        [ArchiveMonth(month=row["month"], post_count=row["total"]) for row in rows],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("blogs", "0013_post_views_trending"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ArchiveMonth",
+            fields=[
+                ("month", models.DateField(primary_key=True, serialize=False)),
+                ("post_count", models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                "ordering": ["-month"],
+            },
+        ),
+        migrations.RunPython(backfill_months, migrations.RunPython.noop),
+    ]
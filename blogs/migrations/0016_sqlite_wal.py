@@ -0,0 +1,23 @@
+from django.db import migrations
+
+
+def enable_wal(apps, schema_editor):
+    # WAL is a property of the database file, so setting it once here lasts
+    # for every later connection. It cannot be changed inside a transaction,
+    # hence atomic = False below.
+    if schema_editor.connection.vendor == "sqlite":
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute("PRAGMA journal_mode=WAL")
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('blogs', '0015_related_posts'),
+    ]
+
+    operations = [
+        migrations.RunPython(enable_wal, migrations.RunPython.noop, elidable=True),
+    ]
@@ -2,13 +2,18 @@ import uuid
 
 from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
-from django.db import models
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, models, transaction
 from django.utils import timezone
 from django.utils.deconstruct import deconstructible
-from django.utils.text import slugify
+
+from . import rendering
+from .slugs import assign_unique_slugs, base_slug, next_free_slug
 
 # Create your models here.
 
+SLUG_ALLOCATION_ATTEMPTS = 5
+
 
 class TimestampModel(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
@@ -48,6 +53,7 @@ class PublishManger(models.Manager):
 class Status(models.TextChoices):
     DRAFT = "draft", "Draft"
     PUBLISHED = "published", "Published"
+    SCHEDULED = "scheduled", "Scheduled"
     archived = "archived", "Archived"
 
 
@@ -61,38 +67,148 @@ class BlogPost(TimestampModel):
     id = models.UUIDField(default=uuid.uuid4, unique=True, primary_key=True)
     title = models.CharField(max_length=250)
     image = models.ImageField(upload_to=GenerateImagePath())
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     slug = models.SlugField(blank=True, unique=True)
     content = models.TextField()
     author = models.ForeignKey(
         Author, on_delete=models.SET_NULL, null=True, related_name="posts"
     )
-    excerpt = models.CharField(max_length=500, blank=True, null=True)
+    # Rendered from ``content`` on save; see blogs.rendering.
+    content_html = models.TextField(blank=True, editable=False)
+    excerpt = models.CharField(max_length=500, blank=True, null=True, editable=False)
+    word_count = models.PositiveIntegerField(default=0, editable=False)
+    reading_time = models.PositiveSmallIntegerField(default=0, editable=False)
+    renderer_version = models.PositiveSmallIntegerField(default=0, editable=False)
     is_published = models.BooleanField(default=False)
     published_at = models.DateTimeField(null=True, blank=True)
     status = models.CharField(
         choices=Status.choices, default=Status.DRAFT, max_length=20
     )
+    comment_count = models.PositiveIntegerField(default=0, editable=False)
+    reply_count = models.PositiveIntegerField(default=0, editable=False)
     objects = models.Manager()
     publishes = PublishManger()
 
+    # Columns written only by signal handlers and background jobs.
+    MAINTAINED_FIELDS = ("comment_count", "reply_count", "image_variants")
+    PUBLICATION_FIELDS = {"is_published", "published_at", "status"}
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        post = super().from_db(db, field_names, values)
+        # What the stored HTML was rendered from, so saves that leave the
+        # content alone skip rendering.
+        post._rendered_content = post.__dict__.get("content")
+        # The author and publication state AuthorStats counted this post as.
+        if "author_id" in post.__dict__ and "is_published" in post.__dict__:
+            post._counted_as = (post.author_id, post.is_published)
+        # The month ArchiveMonth counted this post under.
+        if "is_published" in post.__dict__ and "published_at" in post.__dict__:
+            post._archived_as = post.archive_month
+        return post
+
+    @property
+    def archive_month(self):
+        """The first day of the month a published post is archived under."""
+        if not (self.is_published and self.published_at):
+            return None
+        return timezone.localtime(self.published_at).date().replace(day=1)
+
+    def render(self, force=False):
+        """
+        Refresh the columns precomputed from ``content`` if it changed since
+        they were rendered, or they came from an older renderer. Returns
+        whether anything was rendered.
+        """
+        if (
+            not force
+            and self.renderer_version == rendering.RENDERER_VERSION
+            and self.content == getattr(self, "_rendered_content", None)
+        ):
+            return False
+        for field, value in rendering.render(self.content).items():
+            setattr(self, field, value)
+        self._rendered_content = self.content
+        return True
+
+    def sync_publication(self, now=None):
+        """
+        Bring ``status`` in line with ``is_published`` and ``published_at``.
+
+        A post meant to be published with a future ``published_at`` is
+        scheduled and stays unpublished until publish_scheduled flips it.
+        """
+        if self.status == Status.archived:
+            return
+        if self.is_published or self.status == Status.SCHEDULED:
+            now = now or timezone.now()
+            if not self.published_at:
+                self.published_at = now
+            self.is_published = self.published_at <= now
+            self.status = Status.PUBLISHED if self.is_published else Status.SCHEDULED
+        else:
+            self.status = Status.DRAFT
+
     def save(self, *args, **kwargs):
-        if not self.slug:
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None or self.PUBLICATION_FIELDS & set(update_fields):
+            self.sync_publication()
+            if update_fields is not None:
+                update_fields = {*update_fields, *self.PUBLICATION_FIELDS}
+                kwargs["update_fields"] = update_fields
+        if update_fields is None or "content" in update_fields:
+            if self.render() and update_fields is not None:
+                kwargs["update_fields"] = {*update_fields, *rendering.RENDERED_FIELDS}
+        if (
+            not self._state.adding
+            and not args
+            and not kwargs.get("force_insert")
+            and kwargs.get("update_fields") is None
+        ):
+            # A full-row save of a stale instance must not overwrite the
+            # columns that signals and background jobs maintain.
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.MAINTAINED_FIELDS
+            ]
+        if self.slug:
+            return super().save(*args, **kwargs)
+
+        # Two concurrent saves can pick the same free slug; the loser hits
+        # the unique index and allocates again.
+        for attempt in range(SLUG_ALLOCATION_ATTEMPTS):
             self.slug = self.generate_unique_slug(BlogPost, self.title)
-        if self.is_published and not self.published_at:
-            self.published_at = timezone.now()
-        if self.content and not self.excerpt:
-            self.excerpt = self.content[:247].rsplit(" ", 1)[0] + "..."
+            try:
+                with transaction.atomic():
+                    return super().save(*args, **kwargs)
+            except IntegrityError:
+                retry = attempt + 1 < SLUG_ALLOCATION_ATTEMPTS
+                if not retry or not BlogPost.objects.filter(slug=self.slug).exists():
+                    raise
 
-        return super().save(*args, **kwargs)
+    def _srcset(self, extension):
+        return ", ".join(
+            f"{default_storage.url(name)} {width}w"
+            for width, name in (self.image_variants or {}).get(extension, [])
+        )
+
+    @property
+    def webp_srcset(self):
+        return self._srcset("webp")
+
+    @property
+    def jpeg_srcset(self):
+        return self._srcset("jpeg")
 
     def generate_unique_slug(self, model_class, title):
-        slug = slugify(title)
-        base_slug = slug
-        counter = 1
-        while model_class.objects.filter(slug=slug).exists():
-            slug = f"{base_slug}-{counter}"
-            counter += 1
-        return slug
+        return next_free_slug(model_class.objects.all(), base_slug(title))
+
+    @classmethod
+    def assign_unique_slugs(cls, posts, chunk_size=500, reserved=None):
+        return assign_unique_slugs(
+            posts, cls.objects.all(), chunk_size=chunk_size, reserved=reserved
+        )
 
     def clean(self):
         if self.status == Status.PUBLISHED:
@@ -109,6 +225,7 @@ class BlogPost(TimestampModel):
         indexes = [
             models.Index(fields=["title"]),
             models.Index(fields=["is_published", "published_at"]),
+            models.Index(fields=["created_at", "id"]),
         ]
 
     def __str__(self):
@@ -131,9 +248,269 @@ class Comment(TimestampModel):
     post = models.ForeignKey(
         BlogPost, on_delete=models.CASCADE, related_name="comments"
     )
+    # Materialized path: one fixed-width, time-ordered segment per ancestor,
+    # so ordering a thread by ``path`` yields it in display (pre-)order.
+    path = models.CharField(max_length=1000, blank=True, editable=False)
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
+
+    PATH_SEPARATOR = "/"
+    PATH_SEGMENT_LENGTH = 20
+    # The deepest level whose path still fits in the column. A reply to a
+    # comment at this depth becomes its sibling instead; see assign_path().
+    MAX_DEPTH = (1000 - PATH_SEGMENT_LENGTH) // (PATH_SEGMENT_LENGTH + 1)
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["post", "depth", "created_at", "id"]),
+            models.Index(fields=["path"]),
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self.path:
+            self.assign_path()
+        return super().save(*args, **kwargs)
+
+    def assign_path(self):
+        # Called directly for comments written with bulk_create(), which
+        # skips save().
+        segment = self.path_segment(timezone.now(), self.id)
+        if self.parent_id and self.parent.depth >= self.MAX_DEPTH:
+            # Attach to the deepest ancestor that still has room.
+            sibling = self.parent
+            self.parent_id = sibling.parent_id
+            prefix = sibling.path.rpartition(self.PATH_SEPARATOR)[0]
+            self.path = f"{prefix}{self.PATH_SEPARATOR}{segment}"
+            self.depth = sibling.depth
+        elif self.parent_id:
+            self.path = f"{self.parent.path}{self.PATH_SEPARATOR}{segment}"
+            self.depth = self.parent.depth + 1
+        else:
+            self.path = segment
+            self.depth = 0
+
+    @staticmethod
+    def path_segment(created_at, pk):
+        return f"{int(created_at.timestamp() * 1_000_000):014x}{pk.hex[:6]}"
+
+    @classmethod
+    def load_threads(cls, roots, max_depth):
+        """
+        Attach every reply below ``roots`` as ``root.thread`` in one query.
+
+        Replies come back in path order with authors joined; replies nested
+        deeper than ``max_depth`` are indented at ``max_depth``.
+        """
+        roots, replies = cls._thread_query(roots)
+        if replies is not None:
+            cls._attach_replies(roots, replies, max_depth)
+        return roots
+
+    @classmethod
+    async def aload_threads(cls, roots, max_depth):
+        roots, replies = cls._thread_query(roots)
+        if replies is not None:
+            cls._attach_replies(
+                roots, [r async for r in replies.aiterator()], max_depth
+            )
+        return roots
+
+    @classmethod
+    def _thread_query(cls, roots):
+        roots = list(roots)
+        for root in roots:
+            root.thread = []
+        if not roots:
+            return roots, None
+        subtree = models.Q()
+        for root in roots:
+            subtree |= models.Q(
+                path__gt=root.path + cls.PATH_SEPARATOR,
+                path__lt=root.path + chr(ord(cls.PATH_SEPARATOR) + 1),
+            )
+        replies = (
+            cls.objects.filter(subtree, post_id=roots[0].post_id)
+            .select_related("author__user")
+            .order_by("path")
+        )
+        return roots, replies
+
+    @classmethod
+    def _attach_replies(cls, roots, replies, max_depth):
+        by_root = {root.path: root for root in roots}
+        for reply in replies:
+            reply.indent = min(reply.depth, max_depth)
+            by_root[reply.path.split(cls.PATH_SEPARATOR, 1)[0]].thread.append(reply)
 
     def __str__(self):
         return f"Comment by {self.author.full_name if self.author else 'Anonymous'}"
+
+
+class AuthorStats(models.Model):
+    """
+    Per-author counters kept up to date by signal handlers in
+    blogs.signals; ``manage.py reconcile_author_stats`` rebuilds them.
+    """
+
+    author = models.OneToOneField(
+        Author, on_delete=models.CASCADE, primary_key=True, related_name="stats"
+    )
+    post_count = models.PositiveIntegerField(default=0)
+    published_count = models.PositiveIntegerField(default=0)
+    comments_received = models.PositiveIntegerField(default=0)
+    comments_written = models.PositiveIntegerField(default=0)
+    last_activity_at = models.DateTimeField(null=True, blank=True)
+
+    COUNTERS = (
+        "post_count",
+        "published_count",
+        "comments_received",
+        "comments_written",
+    )
+
+    class Meta:
+        verbose_name_plural = "author stats"
+
+    def __str__(self):
+        return f"Stats for {self.author_id}"
+
+
+class PostViewBucket(models.Model):
+    """
+    Page views of one post within one time bucket. blogs.popularity counts
+    views in memory and adds them here in batches; nothing is written per view.
+    """
+
+    post = models.ForeignKey(
+        BlogPost, on_delete=models.CASCADE, related_name="view_buckets"
+    )
+    bucket = models.DateTimeField()
+    views = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [models.Index(fields=["bucket"])]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["post", "bucket"], name="unique_post_view_bucket"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.views} views of {self.post_id} at {self.bucket}"
+
+
+class TrendingScore(models.Model):
+    """
+    A post's time-decayed view score, as a logarithm measured against a
+    fixed epoch so that scores updated at different times still compare;
+    see blogs.popularity.
+    """
+
+    post = models.OneToOneField(
+        BlogPost, on_delete=models.CASCADE, primary_key=True, related_name="trending"
+    )
+    score = models.FloatField()
+
+    class Meta:
+        indexes = [models.Index(fields=["-score"])]
+
+    def __str__(self):
+        return f"Trending score of {self.post_id}"
+
+
+class ArchiveMonth(models.Model):
+    """
+    The number of published posts in one month, kept up to date by signal
+    handlers in blogs.signals; ``manage.py rebuild_archive`` rebuilds it.
+    """
+
+    month = models.DateField(primary_key=True)
+    post_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ["-month"]
+
+    def __str__(self):
+        return f"{self.month:%B %Y}: {self.post_count}"
+
+
+class PostTerm(models.Model):
+    """
+    One of a post's heaviest TF-IDF terms and its weight in the post's
+    normalised vector. The rows double as the inverted index that
+    blogs.related scores related posts with.
+    """
+
+    post = models.ForeignKey(BlogPost, on_delete=models.CASCADE, related_name="terms")
+    term = models.CharField(max_length=64)
+    weight = models.FloatField()
+
+    class Meta:
+        indexes = [models.Index(fields=["term"])]
+        constraints = [
+            models.UniqueConstraint(fields=["post", "term"], name="unique_post_term")
+        ]
+
+    def __str__(self):
+        return f"{self.term} in {self.post_id}"
+
+
+class RelatedPost(models.Model):
+    """
+    One of a post's nearest neighbours by TF-IDF cosine similarity, kept up
+    to date by blogs.related; ``manage.py rebuild_related`` rebuilds them.
+    """
+
+    post = models.ForeignKey(
+        BlogPost, on_delete=models.CASCADE, related_name="related_posts"
+    )
+    related = models.ForeignKey(BlogPost, on_delete=models.CASCADE, related_name="+")
+    score = models.FloatField()
+
+    class Meta:
+        indexes = [models.Index(fields=["post", "-score"])]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["post", "related"], name="unique_related_post"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.related_id} related to {self.post_id}"
+
+
+class OutboxStatus(models.TextChoices):
+    PENDING = "pending", "Pending"
+    SENDING = "sending", "Sending"
+    SENT = "sent", "Sent"
+    FAILED = "failed", "Failed"
+
+
+class OutboxEmail(TimestampModel):
+    subject = models.CharField(max_length=255)
+    message = models.TextField()
+    from_email = models.CharField(max_length=254, blank=True)
+    recipients = models.JSONField(default=list)
+    dedupe_key = models.CharField(max_length=64)
+    status = models.CharField(
+        choices=OutboxStatus.choices, default=OutboxStatus.PENDING, max_length=20
+    )
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    claim = models.UUIDField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["next_attempt_at"]
+        indexes = [models.Index(fields=["status", "next_attempt_at"])]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["dedupe_key"],
+                condition=models.Q(status__in=["pending", "sending"]),
+                name="unique_queued_outbox_email",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.subject} -> {', '.join(self.recipients)}"
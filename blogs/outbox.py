@@ -0,0 +1,148 @@
+import hashlib
+import logging
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import OutboxEmail, OutboxStatus
+
+logger = logging.getLogger(__name__)
+
+
+def max_attempts():
+    return getattr(settings, "OUTBOX_MAX_ATTEMPTS", 5)
+
+
+def stale_claim_seconds():
+    return getattr(settings, "OUTBOX_STALE_CLAIM_SECONDS", 600)
+
+
+def dedupe_key_for(subject, message, recipients):
+    payload = "\x1f".join([subject, message, *sorted(recipients)])
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def enqueue_email(subject, message, recipient_list, from_email=None):
+    """
+    Queue an email for the ``send_outbox`` worker.
+
+    An identical message that is still waiting to be sent is not queued a
+    second time. Returns the queued row, or ``None`` when it was a duplicate.
+    """
+    recipients = [address for address in recipient_list if address]
+    if not recipients:
+        return None
+    try:
+        with transaction.atomic():
+            return OutboxEmail.objects.create(
+                subject=subject,
+                message=message,
+                from_email=from_email or settings.EMAIL_HOST_USER,
+                recipients=recipients,
+                dedupe_key=dedupe_key_for(subject, message, recipients),
+            )
+    except IntegrityError:
+        return None
+
+
+def retry_delay(attempts):
+    base = getattr(settings, "OUTBOX_RETRY_BASE_SECONDS", 30)
+    ceiling = getattr(settings, "OUTBOX_RETRY_MAX_SECONDS", 3600)
+    return timedelta(seconds=min(base * 2 ** (attempts - 1), ceiling))
+
+
+def release_stale_claims(now=None):
+    now = now or timezone.now()
+    return OutboxEmail.objects.filter(
+        status=OutboxStatus.SENDING,
+        updated_at__lt=now - timedelta(seconds=stale_claim_seconds()),
+    ).update(status=OutboxStatus.PENDING, claim=None, updated_at=now)
+
+
+def claim_batch(batch_size, now=None):
+    now = now or timezone.now()
+    claim = uuid.uuid4()
+    due = OutboxEmail.objects.filter(
+        status=OutboxStatus.PENDING, next_attempt_at__lte=now
+    ).values_list("pk", flat=True)[:batch_size]
+    OutboxEmail.objects.filter(pk__in=list(due), status=OutboxStatus.PENDING).update(
+        status=OutboxStatus.SENDING, claim=claim, updated_at=now
+    )
+    return list(OutboxEmail.objects.filter(claim=claim, status=OutboxStatus.SENDING))
+
+
+def _mark_failed(email, error, now):
+    email.attempts += 1
+    email.last_error = str(error)
+    email.claim = None
+    if email.attempts >= max_attempts():
+        email.status = OutboxStatus.FAILED
+    else:
+        email.status = OutboxStatus.PENDING
+        email.next_attempt_at = now + retry_delay(email.attempts)
+    email.save(
+        update_fields=[
+            "attempts",
+            "last_error",
+            "claim",
+            "status",
+            "next_attempt_at",
+            "updated_at",
+        ]
+    )
+
+
+def send_batch(batch_size=100, connection=None):
+    """
+    Send one batch of due emails over a single backend connection.
+
+    Returns ``(sent, failed)``. A message that raises is rescheduled with
+    exponential backoff until ``OUTBOX_MAX_ATTEMPTS`` is reached.
+    """
+    now = timezone.now()
+    emails = claim_batch(batch_size, now)
+    if not emails:
+        return 0, 0
+
+    connection = connection or get_connection(fail_silently=False)
+    sent = failed = 0
+    try:
+        connection.open()
+    except Exception as exc:
+        logger.warning("Could not open email connection: %s", exc)
+        for email in emails:
+            _mark_failed(email, exc, now)
+        return 0, len(emails)
+
+    sent_ids = []
+    try:
+        for email in emails:
+            message = EmailMessage(
+                subject=email.subject,
+                body=email.message,
+                from_email=email.from_email or None,
+                to=email.recipients,
+                connection=connection,
+            )
+            try:
+                message.send()
+            except Exception as exc:
+                logger.warning("Sending outbox email %s failed: %s", email.pk, exc)
+                _mark_failed(email, exc, now)
+                failed += 1
+            else:
+                sent_ids.append(email.pk)
+                sent += 1
+    finally:
+        connection.close()
+        OutboxEmail.objects.filter(pk__in=sent_ids).update(
+            status=OutboxStatus.SENT,
+            claim=None,
+            sent_at=timezone.now(),
+            updated_at=timezone.now(),
+        )
+    return sent, failed
@@ -0,0 +1,140 @@
+import base64
+import binascii
+import uuid
+from datetime import datetime
+
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+
+def encode_cursor(obj, field="created_at"):
+    raw = f"{getattr(obj, field).isoformat()}|{obj.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        created_at, pk = raw.split("|", 1)
+        return datetime.fromisoformat(created_at), uuid.UUID(pk)
+    except (ValueError, binascii.Error, UnicodeDecodeError):
+        return None
+
+
+class KeysetPage:
+    """
+    A page of results ordered by ``(-field, -id)``, where ``field`` is a
+    datetime column, ``created_at`` unless given.
+
+    Exposes the same ``has_next``/``has_previous`` interface templates use
+    with Django's ``Page``, but links are cursors instead of page numbers, so
+    no ``COUNT(*)`` is needed and every page is a single index range scan.
+    """
+
+    def __init__(self, object_list, has_next, has_previous, field="created_at"):
+        self.object_list = object_list
+        self._has_next = has_next
+        self._has_previous = has_previous
+        self.field = field
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @property
+    def next_cursor(self):
+        if self._has_next and self.object_list:
+            return encode_cursor(self.object_list[-1], self.field)
+        return None
+
+    @property
+    def previous_cursor(self):
+        if self._has_previous and self.object_list:
+            return encode_cursor(self.object_list[0], self.field)
+        return None
+
+
+def _keyset_range(queryset, page_size, after, before, field):
+    # One row past the page tells whether another page follows.
+    if before:
+        value, pk = before
+        return queryset.filter(
+            Q(**{f"{field}__gt": value}) | Q(**{field: value, "id__gt": pk})
+        ).order_by(field, "id")[: page_size + 1]
+
+    queryset = queryset.order_by(f"-{field}", "-id")
+    if after:
+        value, pk = after
+        queryset = queryset.filter(
+            Q(**{f"{field}__lt": value}) | Q(**{field: value, "id__lt": pk})
+        )
+    return queryset[: page_size + 1]
+
+
+def _keyset_page(rows, page_size, after, before, field):
+    if before:
+        has_previous = len(rows) > page_size
+        rows = rows[:page_size]
+        rows.reverse()
+        return KeysetPage(rows, has_next=True, has_previous=has_previous, field=field)
+    has_next = len(rows) > page_size
+    return KeysetPage(
+        rows[:page_size], has_next=has_next, has_previous=bool(after), field=field
+    )
+
+
+def keyset_paginate(queryset, page_size, after=None, before=None, field="created_at"):
+    rows = list(_keyset_range(queryset, page_size, after, before, field))
+    return _keyset_page(rows, page_size, after, before, field)
+
+
+async def akeyset_paginate(
+    queryset, page_size, after=None, before=None, field="created_at"
+):
+    range_ = _keyset_range(queryset, page_size, after, before, field)
+    rows = [row async for row in range_.aiterator()]
+    return _keyset_page(rows, page_size, after, before, field)
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator for admin changelists that estimates the size of an unfiltered
+    table instead of counting it.
+
+    On SQLite the highest rowid is one B-tree lookup where COUNT(*) reads the
+    whole table. It overcounts by the rows deleted since, so it is only used
+    from ``exact_below`` rows up; filtered lists are always counted.
+    """
+
+    exact_below = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[getattr(queryset, "db", "default")]
+        if (
+            hasattr(queryset, "query")
+            and not queryset.query.where
+            and connection.vendor == "sqlite"
+        ):
+            table = connection.ops.quote_name(queryset.model._meta.db_table)
+            with connection.cursor() as cursor:
+                cursor.execute(f"SELECT MAX(rowid) FROM {table}")
+                estimate = cursor.fetchone()[0] or 0
+            if estimate >= self.exact_below:
+                return estimate
+        return super().count
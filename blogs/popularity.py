@@ -0,0 +1,271 @@
+import atexit
+import itertools
+import logging
+import math
+import threading
+from collections import Counter
+from datetime import datetime
+from datetime import timezone as dt_timezone
+
+from django.conf import settings
+from django.db import (
+    DatabaseError,
+    close_old_connections,
+    connection,
+    connections,
+    transaction,
+)
+from django.utils import timezone
+
+from . import fragments
+from .models import BlogPost, PostViewBucket, TrendingScore
+
+logger = logging.getLogger(__name__)
+
+_counter = None
+_counter_lock = threading.Lock()
+
+
+def bucket_seconds():
+    return getattr(settings, "POST_VIEW_BUCKET_SECONDS", 3600)
+
+
+def decay_rate():
+    half_life = getattr(settings, "TRENDING_HALF_LIFE_HOURS", 24) * 3600
+    return math.log(2) / half_life
+
+
+def bucket_start(when):
+    seconds = int(when.timestamp())
+    return datetime.fromtimestamp(
+        seconds - seconds % bucket_seconds(), tz=dt_timezone.utc
+    )
+
+
+# A post's score is sum(views * exp(-rate * (now - bucket))) over its buckets.
+# Ranking only needs scores taken at the same ``now``, and multiplying every
+# score by exp(rate * now) keeps their order, so each post stores
+# log(sum(views * exp(rate * bucket))) instead. That value never decays, so
+# new views are added to one row without touching any other post's score.
+
+
+def view_weight(views, bucket):
+    return math.log(views) + decay_rate() * bucket.timestamp()
+
+
+def add_weights(a, b):
+    if a is None:
+        return b
+    high, low = max(a, b), min(a, b)
+    return high + math.log1p(math.exp(low - high))
+
+
+def _upsert_buckets(rows):
+    table = PostViewBucket._meta.db_table
+    post = PostViewBucket._meta.get_field("post")
+    bucket = PostViewBucket._meta.get_field("bucket")
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"INSERT INTO {table} (post_id, bucket, views) VALUES (%s, %s, %s) "
+            f"ON CONFLICT (post_id, bucket) "
+            f"DO UPDATE SET views = {table}.views + excluded.views",
+            [
+                (
+                    post.get_db_prep_value(post_id, connection),
+                    bucket.get_db_prep_value(when, connection),
+                    views,
+                )
+                for post_id, when, views in rows
+            ],
+        )
+
+
+def record_views(counts, now=None):
+    """
+    Add ``counts`` (views per post id) to the current time bucket and to the
+    posts' trending scores, in one transaction.
+    """
+    bucket = bucket_start(now or timezone.now())
+    with transaction.atomic():
+        # Posts deleted since they were viewed would fail the foreign keys.
+        post_ids = set(
+            BlogPost.objects.filter(pk__in=counts).values_list("pk", flat=True)
+        )
+        if not post_ids:
+            return
+        _upsert_buckets([(pk, bucket, counts[pk]) for pk in post_ids])
+        scores = dict(
+            TrendingScore.objects.select_for_update()
+            .filter(post__in=post_ids)
+            .values_list("post", "score")
+        )
+        TrendingScore.objects.bulk_create(
+            [
+                TrendingScore(
+                    post_id=pk,
+                    score=add_weights(scores.get(pk), view_weight(counts[pk], bucket)),
+                )
+                for pk in post_ids
+            ],
+            update_conflicts=True,
+            unique_fields=["post"],
+            update_fields=["score"],
+        )
+    fragments.bump(fragments.TRENDING_SCOPE)
+
+
+def rebuild_scores(since=None, chunk_size=500, progress=None):
+    """
+    Recompute every trending score from the view buckets, ``chunk_size``
+    posts at a time. Buckets before ``since`` are deleted first. Returns the
+    number of posts scored.
+    """
+    if since is not None:
+        PostViewBucket.objects.filter(bucket__lt=since).delete()
+    post_ids = (
+        PostViewBucket.objects.order_by("post")
+        .values_list("post", flat=True)
+        .distinct()
+    )
+    scored = 0
+    last_pk = None
+    while True:
+        chunk = post_ids.filter(post__gt=last_pk) if last_pk else post_ids
+        ids = list(chunk[:chunk_size])
+        if not ids:
+            break
+        scores = {}
+        for post_id, bucket, views in PostViewBucket.objects.filter(
+            post__in=ids, views__gt=0
+        ).values_list("post", "bucket", "views"):
+            scores[post_id] = add_weights(
+                scores.get(post_id), view_weight(views, bucket)
+            )
+        TrendingScore.objects.bulk_create(
+            [TrendingScore(post_id=pk, score=score) for pk, score in scores.items()],
+            update_conflicts=True,
+            unique_fields=["post"],
+            update_fields=["score"],
+        )
+        scored += len(ids)
+        last_pk = ids[-1]
+        if progress:
+            progress(scored)
+    TrendingScore.objects.exclude(
+        post__in=PostViewBucket.objects.filter(views__gt=0).values("post")
+    ).delete()
+    fragments.bump(fragments.TRENDING_SCOPE)
+    return scored
+
+
+def trending(limit=None):
+    """The published posts with the highest trending scores."""
+    return (
+        TrendingScore.objects.filter(post__is_published=True)
+        .select_related("post")
+        .only("score", "post__id", "post__title", "post__slug")
+        .order_by("-score")[: limit or getattr(settings, "TRENDING_SIZE", 5)]
+    )
+
+
+class ViewCounter:
+    """
+    In-process page view counts, written to the database every ``interval``
+    seconds by record_views() on a background thread.
+
+    Each worker process counts its own views. Within a process the counts
+    are split over ``shards`` separately locked counters, one per request
+    thread, so threads do not wait on each other to count. With
+    ``interval=0`` there is no thread and counts wait for flush(). close()
+    writes what is left and runs at exit.
+    """
+
+    def __init__(self, interval=10.0, shards=8):
+        self.interval = interval
+        self.locks = [threading.Lock() for _ in range(shards)]
+        self.counts = [Counter() for _ in range(shards)]
+        self.flush_lock = threading.Lock()
+        self.local = threading.local()
+        self.next_shard = itertools.count()
+        self.stopped = threading.Event()
+        self.thread = None
+        self.start_lock = threading.Lock()
+
+    def record(self, post_id):
+        shard = getattr(self.local, "shard", None)
+        if shard is None:
+            shard = self.local.shard = next(self.next_shard) % len(self.locks)
+        with self.locks[shard]:
+            self.counts[shard][post_id] += 1
+        if self.interval and self.thread is None:
+            self._start()
+
+    def drain(self):
+        counts = Counter()
+        for shard, lock in enumerate(self.locks):
+            with lock:
+                counts.update(self.counts[shard])
+                self.counts[shard] = Counter()
+        return counts
+
+    def flush(self, now=None):
+        """Write the counts so far. Returns the number of views written."""
+        with self.flush_lock:
+            counts = self.drain()
+            if not counts:
+                return 0
+            try:
+                record_views(counts, now)
+            except DatabaseError:
+                logger.exception("Writing %d post views failed", counts.total())
+                # Keep them for the next flush.
+                with self.locks[0]:
+                    self.counts[0].update(counts)
+                return 0
+            return counts.total()
+
+    def close(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+        self.flush()
+
+    def _start(self):
+        with self.start_lock:
+            if self.thread is None and not self.stopped.is_set():
+                self.thread = threading.Thread(
+                    target=self._run, name="view-counter", daemon=True
+                )
+                self.thread.start()
+
+    def _run(self):
+        try:
+            while not self.stopped.wait(self.interval):
+                close_old_connections()
+                self.flush()
+        finally:
+            connections.close_all()
+
+
+def get_counter():
+    global _counter
+    with _counter_lock:
+        if _counter is None:
+            _counter = ViewCounter(
+                interval=getattr(settings, "POST_VIEW_FLUSH_INTERVAL", 10.0)
+            )
+            atexit.register(_counter.close)
+        return _counter
+
+
+def close_counter():
+    """Write and stop the process's counter; the next view starts a new one."""
+    global _counter
+    with _counter_lock:
+        counter, _counter = _counter, None
+    if counter is not None:
+        counter.close()
+
+
+def record_view(post_id):
+    get_counter().record(post_id)
@@ -0,0 +1,344 @@
+import logging
+import re
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.db.models import Count
+
+from . import fragments
+from .models import BlogPost, PostTerm, RelatedPost
+
+logger = logging.getLogger(__name__)
+
+# Related posts are a post's nearest neighbours by cosine similarity of
+# TF-IDF vectors over its title and content. Each vector is cut to its
+# TERMS_PER_POST heaviest terms and stored as PostTerm rows, which double as
+# the inverted index: a post's similarity to every other post is a sum over
+# the postings of its own terms, so scoring never compares posts that share
+# no term.
+
+TITLE_WEIGHT = 3
+TERMS_PER_POST = 64
+# Terms in fewer than MIN_DF posts cannot relate two posts, and terms in more
+# than MAX_DF of them relate everything; both are left out of the vocabulary.
+MIN_DF = 2
+MAX_DF = 0.5
+MAX_TERM_LENGTH = 64
+
+STOP_WORDS = frozenset("""
+    about above after again against all also and any are because been before
+    being below between both but can could did does doing down during each
+    few for from further had has have having her here hers herself him
+    himself his how into its itself just more most myself nor not now off
+    once only other our ours ourselves out over own same she should some
+    such than that the their theirs them themselves then there these they
+    this those through too under until very was were what when where which
+    while who whom why will with would you your yours yourself yourselves
+    """.split())
+
+_WORD = re.compile(r"[^\W\d_]{3,}")
+
+# The matrix the pool workers score against; see _init_worker().
+_matrix = None
+
+
+def neighbour_count():
+    return getattr(settings, "RELATED_POSTS_K", 10)
+
+
+def _words(text):
+    for word in _WORD.findall(text.lower()):
+        if word not in STOP_WORDS and len(word) <= MAX_TERM_LENGTH:
+            yield word
+
+
+def tokenize(title, content):
+    """Term frequencies of a post, with title words counted TITLE_WEIGHT times."""
+    counts = Counter(_words(content))
+    for word in _words(title):
+        counts[word] += TITLE_WEIGHT
+    return counts
+
+
+def _tokenize_chunk(rows):
+    return [tokenize(title, content) for title, content in rows]
+
+
+def idf(df, total):
+    return np.log((1 + total) / (1 + np.asarray(df, dtype=np.float64))) + 1
+
+
+def weigh(counts, idfs):
+    """
+    The L2-normalised TF-IDF vector of ``counts`` over the terms in
+    ``idfs``, cut to its TERMS_PER_POST heaviest terms, as (terms, weights).
+    """
+    terms = [term for term in counts if term in idfs]
+    if not terms:
+        return [], np.empty(0)
+    weights = (1 + np.log([counts[term] for term in terms])) * np.array(
+        [idfs[term] for term in terms]
+    )
+    if len(terms) > TERMS_PER_POST:
+        keep = np.argpartition(-weights, TERMS_PER_POST)[:TERMS_PER_POST]
+        terms, weights = [terms[i] for i in keep], weights[keep]
+    return terms, weights / np.linalg.norm(weights)
+
+
+def top_k(scores, k):
+    """Indexes of the ``k`` highest positive ``scores``, best first."""
+    found = np.flatnonzero(scores > 0)
+    if len(found) > k:
+        found = found[np.argpartition(-scores[found], k)[:k]]
+    return found[np.lexsort((found, -scores[found]))]
+
+
+def _gather(starts, lengths):
+    """The concatenated ranges [start, start + length) as one index array."""
+    ends = np.cumsum(lengths)
+    return np.repeat(starts - ends + lengths, lengths) + np.arange(ends[-1])
+
+
+def _init_worker(matrix):
+    global _matrix
+    _matrix = matrix
+
+
+def _neighbours(bounds):
+    """
+    Score rows [start, stop) of the shared matrix against every row. Runs in
+    pool workers, so it only touches NumPy. Returns (start, [(rows, scores)]).
+    """
+    start, stop = bounds
+    indptr, indices, data, postings, k = _matrix
+    post_indptr, post_rows, post_weights = postings
+    size = len(indptr) - 1
+    results = []
+    for row in range(start, stop):
+        terms = indices[indptr[row] : indptr[row + 1]]
+        lengths = post_indptr[terms + 1] - post_indptr[terms]
+        if not lengths.sum():
+            results.append((np.empty(0, dtype=np.int64), np.empty(0)))
+            continue
+        entries = _gather(post_indptr[terms], lengths)
+        query = np.repeat(data[indptr[row] : indptr[row + 1]], lengths)
+        scores = np.bincount(
+            post_rows[entries],
+            weights=query * post_weights[entries],
+            minlength=size,
+        )
+        scores[row] = 0
+        found = top_k(scores, k)
+        results.append((found, scores[found]))
+    return start, results
+
+
+def _map(function, chunks, workers, matrix=None):
+    chunks = list(chunks)
+    if workers == 1 or len(chunks) < 2:
+        _init_worker(matrix)
+        try:
+            yield from map(function, chunks)
+        finally:
+            _init_worker(None)
+        return
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(matrix,)
+    ) as executor:
+        yield from executor.map(function, chunks)
+
+
+def _chunks(items, size):
+    return [items[start : start + size] for start in range(0, len(items), size)]
+
+
+def build_matrix(documents):
+    """
+    Weigh tokenized ``documents`` against their own document frequencies.
+    Returns the vocabulary and the vectors as CSR arrays (indptr, indices,
+    data), with the same vectors by term (the postings) for scoring.
+    """
+    total = len(documents)
+    df = Counter(term for counts in documents for term in counts)
+    vocabulary = sorted(
+        term for term, count in df.items() if MIN_DF <= count <= MAX_DF * total
+    )
+    idfs = dict(zip(vocabulary, idf([df[term] for term in vocabulary], total)))
+    term_ids = {term: number for number, term in enumerate(vocabulary)}
+    indptr, indices, data = [0], [], []
+    for counts in documents:
+        terms, weights = weigh(counts, idfs)
+        indices.extend(term_ids[term] for term in terms)
+        data.extend(weights)
+        indptr.append(len(indices))
+    indptr = np.array(indptr, dtype=np.int64)
+    indices = np.array(indices, dtype=np.int64)
+    data = np.array(data, dtype=np.float64)
+
+    rows = np.repeat(np.arange(total), np.diff(indptr))
+    order = np.argsort(indices, kind="stable")
+    post_indptr = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(indices, minlength=len(vocabulary)), out=post_indptr[1:])
+    postings = (post_indptr, rows[order], data[order])
+    return vocabulary, (indptr, indices, data), postings
+
+
+def rebuild(workers=None, chunk_size=500, progress=None):
+    """
+    Recompute every post's terms and related posts, with tokenizing and
+    scoring spread over ``workers`` processes, ``chunk_size`` posts per task.
+    Returns the number of posts.
+    """
+    posts = BlogPost.objects.order_by("pk").values_list("pk", "title", "content")
+    pks, rows = [], []
+    for pk, title, content in posts.iterator(chunk_size=chunk_size):
+        pks.append(pk)
+        rows.append((title, content))
+    documents = [
+        counts
+        for chunk in _map(_tokenize_chunk, _chunks(rows, chunk_size), workers)
+        for counts in chunk
+    ]
+    del rows
+    vocabulary, (indptr, indices, data), postings = build_matrix(documents)
+
+    k = neighbour_count()
+    matrix = (indptr, indices, data, postings, k)
+    bounds = [
+        (start, min(start + chunk_size, len(pks)))
+        for start in range(0, len(pks), chunk_size)
+    ]
+    links = []
+    for start, results in _map(_neighbours, bounds, workers, matrix):
+        for row, (found, scores) in enumerate(results, start):
+            links.extend(
+                RelatedPost(post_id=pks[row], related_id=pks[other], score=score)
+                for other, score in zip(found.tolist(), scores.tolist())
+            )
+        if progress:
+            progress(start + len(results))
+
+    with transaction.atomic():
+        PostTerm.objects.all().delete()
+        PostTerm.objects.bulk_create(
+            (
+                PostTerm(post_id=pks[row], term=vocabulary[term], weight=weight)
+                for row in range(len(pks))
+                for term, weight in zip(
+                    indices[indptr[row] : indptr[row + 1]].tolist(),
+                    data[indptr[row] : indptr[row + 1]].tolist(),
+                )
+            ),
+            batch_size=chunk_size,
+        )
+        RelatedPost.objects.all().delete()
+        RelatedPost.objects.bulk_create(links, batch_size=chunk_size)
+    fragments.bump(fragments.RELATED_SCOPE)
+    return len(pks)
+
+
+def _replace(lists):
+    """Store ``lists`` ({post id: [(related id, score)]}) over the old ones."""
+    RelatedPost.objects.filter(post__in=list(lists)).delete()
+    RelatedPost.objects.bulk_create(
+        RelatedPost(post_id=post_id, related_id=related_id, score=score)
+        for post_id, links in lists.items()
+        for related_id, score in links
+    )
+
+
+def update_post(post_id):
+    """
+    Re-vectorize one post against the stored vocabulary and document
+    frequencies, then update its related posts and its place in theirs.
+
+    New words wait for the next rebuild_related to enter the vocabulary. A
+    post that leaves another's list leaves a gap there until then.
+    """
+    row = BlogPost.objects.filter(pk=post_id).values_list("title", "content").first()
+    if row is None:
+        return
+    counts = tokenize(*row)
+    k = neighbour_count()
+    with transaction.atomic():
+        PostTerm.objects.filter(post=post_id).delete()
+        df = dict(
+            PostTerm.objects.filter(term__in=list(counts))
+            .values("term")
+            .order_by()
+            .annotate(posts=Count("post"))
+            .values_list("term", "posts")
+        )
+        idfs = dict(zip(df, idf(list(df.values()), BlogPost.objects.count())))
+        terms, weights = weigh(counts, idfs)
+        PostTerm.objects.bulk_create(
+            PostTerm(post_id=post_id, term=term, weight=weight)
+            for term, weight in zip(terms, weights.tolist())
+        )
+
+        query = dict(zip(terms, weights.tolist()))
+        postings = list(
+            PostTerm.objects.filter(term__in=terms)
+            .exclude(post=post_id)
+            .values_list("post", "term", "weight")
+        )
+        others = {}
+        rows = np.fromiter(
+            (others.setdefault(pk, len(others)) for pk, _, _ in postings),
+            dtype=np.int64,
+            count=len(postings),
+        )
+        scores = np.bincount(
+            rows,
+            weights=[query[term] * weight for _, term, weight in postings],
+            minlength=len(others),
+        )
+        others = list(others)
+        # Only the closest candidates can make it into another post's list.
+        closest = top_k(scores, 5 * k)
+        candidates = {
+            others[index]: score
+            for index, score in zip(closest.tolist(), scores[closest].tolist())
+        }
+
+        lists = {post_id: list(candidates.items())[:k]}
+        current = {pk: [] for pk in candidates}
+        for pk, related_id, score in RelatedPost.objects.filter(
+            post__in=list(candidates)
+        ).values_list("post", "related", "score"):
+            current[pk].append((related_id, score))
+        for pk, links in current.items():
+            updated = sorted(
+                [link for link in links if link[0] != post_id]
+                + [(post_id, candidates[pk])],
+                key=lambda link: -link[1],
+            )[:k]
+            if updated != sorted(links, key=lambda link: -link[1]):
+                lists[pk] = updated
+        RelatedPost.objects.filter(related=post_id).exclude(
+            post__in=list(candidates)
+        ).delete()
+        _replace(lists)
+    fragments.bump(fragments.RELATED_SCOPE)
+
+
+def safe_update_post(post_id):
+    # Runs after the post's transaction commits; a failure here must not
+    # fail the request that saved the post.
+    try:
+        update_post(post_id)
+    except DatabaseError:
+        logger.exception("Updating related posts of %s failed", post_id)
+
+
+def related_posts(post_id, limit=None):
+    """The published posts most related to ``post_id``, closest first."""
+    return (
+        RelatedPost.objects.filter(post=post_id, related__is_published=True)
+        .select_related("related")
+        .only("score", "related__id", "related__title", "related__slug")
+        .order_by("-score")[: limit or getattr(settings, "RELATED_POSTS_SHOWN", 5)]
+    )
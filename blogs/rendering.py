@@ -0,0 +1,44 @@
+import math
+
+from django.utils.html import linebreaks
+
+# Bump whenever the output of render() changes; render_posts then rebuilds
+# every post stored with an older version.
+RENDERER_VERSION = 1
+
+WORDS_PER_MINUTE = 200
+EXCERPT_LENGTH = 250
+
+RENDERED_FIELDS = (
+    "content_html",
+    "excerpt",
+    "word_count",
+    "reading_time",
+    "renderer_version",
+)
+
+
+def build_excerpt(content, length=EXCERPT_LENGTH):
+    text = " ".join(content.split())
+    if len(text) <= length:
+        return text
+    return text[: length - 3].rsplit(" ", 1)[0] + "..."
+
+
+def reading_time(word_count):
+    return math.ceil(word_count / WORDS_PER_MINUTE)
+
+
+def render(content):
+    """
+    Return the columns precomputed from a post's ``content``, keyed by
+    field name, so pages never have to process the raw text.
+    """
+    word_count = len(content.split())
+    return {
+        "content_html": linebreaks(content, autoescape=True),
+        "excerpt": build_excerpt(content),
+        "word_count": word_count,
+        "reading_time": reading_time(word_count),
+        "renderer_version": RENDERER_VERSION,
+    }
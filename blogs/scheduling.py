@@ -0,0 +1,121 @@
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Case, Count, F, Value, When
+from django.utils import timezone
+
+from . import archive, fragments, stats
+from .models import BlogPost, Status
+
+
+def scheduled_posts():
+    # The queries below must be range scans on the (is_published,
+    # published_at) index. SQLite cannot use an index for the NOT
+    # "is_published" that is_published=False compiles to, but can for IN.
+    return BlogPost.objects.filter(
+        is_published__in=[False], status=Status.SCHEDULED
+    ).order_by()
+
+
+def _publication_scopes(published=()):
+    # Bump the list as a save would; the new updated_at moves the pages'
+    # ETags. The trending and related boxes only list published
+    # posts, and the body of each post in ``published`` shows the
+    # published_at date that publishing may have just set.
+    fragments.bump(
+        fragments.LIST_SCOPE,
+        fragments.TRENDING_SCOPE,
+        fragments.RELATED_SCOPE,
+        *(fragments.body_scope(pk) for pk in published),
+    )
+
+
+def publish_posts(posts, now=None):
+    """
+    Publish the unpublished, unarchived posts among ``posts`` in one UPDATE.
+    Posts dated in the future are published now rather than scheduled.
+    Returns the number of posts published.
+    """
+    now = now or timezone.now()
+    posts = posts.filter(is_published__in=[False]).exclude(status=Status.archived)
+    with transaction.atomic():
+        # update() skips the save signals, so the authors' published counts
+        # and the archive's month counts are adjusted here.
+        rows = list(posts.order_by().values_list("pk", "author"))
+        if not rows:
+            return 0
+        months = archive.month_counts(posts.filter(published_at__lte=now))
+        undated = posts.exclude(published_at__lte=now).count()
+        if undated:
+            month = timezone.localtime(now).date().replace(day=1)
+            months[month] = months.get(month, 0) + undated
+        published = posts.update(
+            is_published=True,
+            status=Status.PUBLISHED,
+            published_at=Case(
+                When(published_at__lte=now, then=F("published_at")),
+                default=Value(now),
+            ),
+            updated_at=now,
+        )
+        for author_id, total in Counter(author for _, author in rows).items():
+            stats.adjust(author_id, published_count=total)
+        archive.adjust(months)
+    _publication_scopes(pk for pk, _ in rows)
+    return published
+
+
+def unpublish_posts(posts, now=None):
+    """
+    Turn the published or scheduled, unarchived posts among ``posts`` back
+    into drafts in one UPDATE. Returns the number of posts changed.
+    """
+    now = now or timezone.now()
+    posts = posts.exclude(status__in=[Status.DRAFT, Status.archived])
+    live = posts.filter(is_published__in=[True])
+    with transaction.atomic():
+        authors = list(live.order_by().values("author").annotate(total=Count("pk")))
+        months = archive.month_counts(live)
+        changed = posts.update(is_published=False, status=Status.DRAFT, updated_at=now)
+        for row in authors:
+            stats.adjust(row["author"], published_count=-row["total"])
+        archive.adjust({month: -total for month, total in months.items()})
+    if changed:
+        _publication_scopes()
+    return changed
+
+
+def archive_posts(posts, now=None):
+    """
+    Mark ``posts`` archived in one UPDATE. Archiving freezes the publication
+    state (see BlogPost.sync_publication), so no counts change. Returns the
+    number of posts changed.
+    """
+    changed = (
+        posts.exclude(status=Status.archived)
+        .order_by()
+        .update(status=Status.archived, updated_at=now or timezone.now())
+    )
+    if changed:
+        _publication_scopes()
+    return changed
+
+
+def publish_due(now=None):
+    """
+    Publish every scheduled post whose ``published_at`` has passed, in one
+    UPDATE. Returns the number of posts published.
+    """
+    now = now or timezone.now()
+    return publish_posts(scheduled_posts().filter(published_at__lte=now), now)
+
+
+def next_due(now=None):
+    """Return when the next scheduled post is due, or None."""
+    return (
+        scheduled_posts()
+        .filter(published_at__gt=now or timezone.now())
+        .order_by("published_at")
+        .values_list("published_at", flat=True)
+        .first()
+    )
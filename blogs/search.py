@@ -0,0 +1,405 @@
+import math
+import re
+import threading
+from collections import defaultdict, namedtuple
+
+from django.db import connection, transaction
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+FTS_TABLE = "blogs_search_fts"
+DOC_TABLE = "blogs_search_doc"
+POST = "post"
+COMMENT = "comment"
+
+# Title matches weigh ten times more than body matches, in both backends.
+TITLE_WEIGHT = 10.0
+BODY_WEIGHT = 1.0
+SNIPPET_TOKENS = 16
+
+_HIGHLIGHT_START = "\x02"
+_HIGHLIGHT_END = "\x03"
+_QUERY_TOKEN = re.compile(r'"([^"]*)"?|(\S+)')
+_WORD = re.compile(r"\w+")
+
+SearchHit = namedtuple("SearchHit", ["kind", "doc_id", "post_id", "snippet", "score"])
+Clause = namedtuple("Clause", ["terms", "prefix"])
+
+
+def parse_query(query):
+    """
+    Split a user query into clauses that must all match.
+
+    ``"quick brown"`` is a phrase, ``fox*`` a prefix, anything else a term.
+    Punctuation inside a word (``e-mail``) turns it into a phrase.
+    """
+    clauses = []
+    for phrase, word in _QUERY_TOKEN.findall(query):
+        prefix = bool(word) and word.endswith("*")
+        terms = tuple(term.lower() for term in _WORD.findall(phrase or word))
+        if terms:
+            clauses.append(Clause(terms, prefix))
+    return clauses
+
+
+def _render_snippet(raw):
+    text = escape(raw)
+    text = text.replace(_HIGHLIGHT_START, "<mark>").replace(_HIGHLIGHT_END, "</mark>")
+    return mark_safe(text)
+
+
+def post_document(post):
+    return (post.id.hex, POST, post.id.hex, post.title, post.content)
+
+
+def comment_document(comment):
+    return (comment.id.hex, COMMENT, comment.post_id.hex, "", comment.content)
+
+
+class FTS5SearchBackend:
+    """
+    Ranked search over the ``blogs_search_fts`` FTS5 table.
+
+    FTS5 cannot index UUIDs, so ``blogs_search_doc`` maps each post or
+    comment id to the integer rowid of its FTS row; updates and deletes go
+    through that table's indexes instead of scanning the FTS content.
+    """
+
+    def to_match(self, clauses):
+        return " ".join(
+            '"%s"%s' % (" ".join(clause.terms), "*" if clause.prefix else "")
+            for clause in clauses
+        )
+
+    def search(self, query, limit=20, kinds=(POST, COMMENT)):
+        clauses = parse_query(query)
+        if not clauses:
+            return []
+        placeholders = ", ".join(["%s"] * len(kinds))
+        sql = (
+            f"SELECT doc.kind, doc.doc_id, doc.post_id, "
+            f"snippet({FTS_TABLE}, -1, %s, %s, '…', {SNIPPET_TOKENS}), "
+            f"bm25({FTS_TABLE}, {TITLE_WEIGHT}, {BODY_WEIGHT}) AS score "
+            f"FROM {FTS_TABLE} JOIN {DOC_TABLE} AS doc ON doc.id = {FTS_TABLE}.rowid "
+            f"WHERE {FTS_TABLE} MATCH %s AND doc.kind IN ({placeholders}) "
+            f"ORDER BY score LIMIT %s"
+        )
+        params = [_HIGHLIGHT_START, _HIGHLIGHT_END, self.to_match(clauses), *kinds]
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params + [-1 if limit is None else limit])
+            rows = cursor.fetchall()
+        return [
+            SearchHit(kind, doc_id, post_id, _render_snippet(snippet), -score)
+            for kind, doc_id, post_id, snippet, score in rows
+        ]
+
+    def _rowids(self, cursor, doc_ids):
+        rowids = {}
+        for start in range(0, len(doc_ids), 500):
+            chunk = doc_ids[start : start + 500]
+            cursor.execute(
+                f"SELECT doc_id, id FROM {DOC_TABLE} WHERE doc_id IN "
+                f"({', '.join(['%s'] * len(chunk))})",
+                chunk,
+            )
+            rowids.update(cursor.fetchall())
+        return rowids
+
+    def index(self, documents):
+        documents = list(documents)
+        if not documents:
+            return
+        with connection.cursor() as cursor:
+            rowids = self._rowids(cursor, [document[0] for document in documents])
+            cursor.executemany(
+                f"DELETE FROM {FTS_TABLE} WHERE rowid = %s",
+                [(rowid,) for rowid in rowids.values()],
+            )
+            new = [document for document in documents if document[0] not in rowids]
+            if new:
+                cursor.executemany(
+                    f"INSERT INTO {DOC_TABLE} (doc_id, kind, post_id) "
+                    f"VALUES (%s, %s, %s)",
+                    [document[:3] for document in new],
+                )
+                rowids.update(self._rowids(cursor, [document[0] for document in new]))
+            cursor.executemany(
+                f"INSERT INTO {FTS_TABLE} (rowid, title, body) VALUES (%s, %s, %s)",
+                [
+                    (rowids[doc_id], title, body)
+                    for doc_id, _, _, title, body in documents
+                ],
+            )
+
+    def remove(self, doc_id=None, post_id=None):
+        column, value = ("post_id", post_id) if post_id else ("doc_id", doc_id)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {FTS_TABLE} WHERE rowid IN "
+                f"(SELECT id FROM {DOC_TABLE} WHERE {column} = %s)",
+                [value],
+            )
+            cursor.execute(f"DELETE FROM {DOC_TABLE} WHERE {column} = %s", [value])
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE}")
+            cursor.execute(f"DELETE FROM {DOC_TABLE}")
+
+    def optimize(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
+
+
+class PythonSearchBackend:
+    """
+    In-process inverted index for databases without FTS5.
+
+    Each process builds the index from the database on first use and then
+    follows the same signals as the FTS5 table. Ranking is a plain TF-IDF
+    with the same title/body weights; there is no stemming.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.loaded = False
+        self.documents = {}
+        self.postings = defaultdict(dict)
+
+    def _ensure_loaded(self):
+        if not self.loaded:
+            rebuild_index(self)
+
+    def _tokens(self, text):
+        return [match.group().lower() for match in _WORD.finditer(text or "")]
+
+    def index(self, documents):
+        with self.lock:
+            for doc_id, kind, post_id, title, body in documents:
+                self._discard(doc_id)
+                fields = (self._tokens(title), self._tokens(body))
+                self.documents[doc_id] = (kind, post_id, title, body, fields)
+                for weight, tokens in zip((TITLE_WEIGHT, BODY_WEIGHT), fields):
+                    for token in tokens:
+                        postings = self.postings[token]
+                        postings[doc_id] = postings.get(doc_id, 0) + weight
+
+    def _discard(self, doc_id):
+        document = self.documents.pop(doc_id, None)
+        if document is None:
+            return
+        for token in set(document[4][0]) | set(document[4][1]):
+            postings = self.postings.get(token)
+            if postings is not None:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self.postings[token]
+
+    def remove(self, doc_id=None, post_id=None):
+        with self.lock:
+            if post_id:
+                doc_ids = [
+                    key for key, doc in self.documents.items() if doc[1] == post_id
+                ]
+            else:
+                doc_ids = [doc_id]
+            for key in doc_ids:
+                self._discard(key)
+
+    def clear(self):
+        with self.lock:
+            self.documents.clear()
+            self.postings.clear()
+            self.loaded = True
+
+    def optimize(self):
+        pass
+
+    def _clause_terms(self, clause):
+        last = clause.terms[-1]
+        if clause.prefix:
+            expansions = [token for token in self.postings if token.startswith(last)]
+        else:
+            expansions = [last] if last in self.postings else []
+        return expansions
+
+    def _phrase_positions(self, tokens, clause, last_terms):
+        width = len(clause.terms)
+        head = list(clause.terms[:-1])
+        for start in range(len(tokens) - width + 1):
+            if tokens[start : start + width - 1] == head and (
+                tokens[start + width - 1] in last_terms
+            ):
+                yield start, start + width
+
+    def _match(self, doc_id, clause, last_terms):
+        tokens = self.documents[doc_id][4]
+        spans = []
+        for field, field_tokens in enumerate(tokens):
+            spans.extend(
+                (field, start, end)
+                for start, end in self._phrase_positions(
+                    field_tokens, clause, last_terms
+                )
+            )
+        return spans
+
+    def search(self, query, limit=20, kinds=(POST, COMMENT)):
+        clauses = parse_query(query)
+        if not clauses:
+            return []
+        with self.lock:
+            self._ensure_loaded()
+            total = len(self.documents) or 1
+            scores = None
+            spans = defaultdict(list)
+            for clause in clauses:
+                last_terms = set(self._clause_terms(clause))
+                clause_scores = {}
+                for term in last_terms:
+                    postings = self.postings[term]
+                    idf = math.log(1 + total / len(postings))
+                    for doc_id, weight in postings.items():
+                        if scores is not None and doc_id not in scores:
+                            continue
+                        clause_scores[doc_id] = (
+                            clause_scores.get(doc_id, 0) + weight * idf
+                        )
+                if len(clause.terms) > 1:
+                    for doc_id in list(clause_scores):
+                        matched = self._match(doc_id, clause, last_terms)
+                        if matched:
+                            spans[doc_id].extend(matched)
+                        else:
+                            del clause_scores[doc_id]
+                else:
+                    for doc_id in clause_scores:
+                        spans[doc_id].extend(self._match(doc_id, clause, last_terms))
+                scores = (
+                    clause_scores
+                    if scores is None
+                    else {
+                        doc_id: scores[doc_id] + score
+                        for doc_id, score in clause_scores.items()
+                    }
+                )
+            ranked = sorted(
+                (
+                    (score, doc_id)
+                    for doc_id, score in (scores or {}).items()
+                    if self.documents[doc_id][0] in kinds
+                ),
+                reverse=True,
+            )[:limit]
+            return [
+                SearchHit(
+                    self.documents[doc_id][0],
+                    doc_id,
+                    self.documents[doc_id][1],
+                    self._snippet(doc_id, spans[doc_id]),
+                    score,
+                )
+                for score, doc_id in ranked
+            ]
+
+    def _snippet(self, doc_id, spans):
+        kind, post_id, title, body, _ = self.documents[doc_id]
+        field = 1 if any(span[0] == 1 for span in spans) else 0
+        text = (title, body)[field]
+        words = list(_WORD.finditer(text or ""))
+        if not words:
+            return _render_snippet(text or "")
+        marked = sorted((start, end) for f, start, end in spans if f == field)
+        first = marked[0][0] if marked else 0
+        start = max(0, first - SNIPPET_TOKENS // 4)
+        end = min(len(words), start + SNIPPET_TOKENS)
+        highlighted = set()
+        for span_start, span_end in marked:
+            highlighted.update(range(span_start, span_end))
+        pieces = ["…" if start else ""]
+        cursor = words[start].start()
+        for position in range(start, end):
+            word = words[position]
+            pieces.append(text[cursor : word.start()])
+            if position in highlighted:
+                pieces.append(_HIGHLIGHT_START + word.group() + _HIGHLIGHT_END)
+            else:
+                pieces.append(word.group())
+            cursor = word.end()
+        pieces.append("…" if end < len(words) else text[cursor:])
+        return _render_snippet("".join(pieces))
+
+
+_backend = None
+
+
+def fts5_available():
+    if connection.vendor != "sqlite":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("PRAGMA compile_options")
+        return any(row[0] == "ENABLE_FTS5" for row in cursor.fetchall())
+
+
+def get_search_backend():
+    global _backend
+    if _backend is None:
+        _backend = FTS5SearchBackend() if fts5_available() else PythonSearchBackend()
+    return _backend
+
+
+def index_post(post):
+    get_search_backend().index([post_document(post)])
+
+
+def index_comment(comment):
+    get_search_backend().index([comment_document(comment)])
+
+
+def index_comments(comments):
+    get_search_backend().index([comment_document(comment) for comment in comments])
+
+
+def remove_post(post_id):
+    get_search_backend().remove(post_id=post_id.hex)
+
+
+def remove_comment(comment_id):
+    get_search_backend().remove(doc_id=comment_id.hex)
+
+
+def search(query, limit=20, kinds=(POST, COMMENT)):
+    return get_search_backend().search(query, limit=limit, kinds=kinds)
+
+
+def rebuild_index(backend=None, chunk_size=500, progress=None):
+    from .models import BlogPost, Comment
+
+    backend = backend or get_search_backend()
+    backend.clear()
+    indexed = 0
+    sources = (
+        (BlogPost.objects.only("id", "title", "content"), post_document),
+        (Comment.objects.only("id", "post_id", "content"), comment_document),
+    )
+    for queryset, to_document in sources:
+        chunk = []
+        for obj in queryset.order_by().iterator(chunk_size=chunk_size):
+            chunk.append(to_document(obj))
+            if len(chunk) >= chunk_size:
+                with transaction.atomic():
+                    backend.index(chunk)
+                indexed += len(chunk)
+                chunk = []
+                if progress:
+                    progress(indexed)
+        if chunk:
+            with transaction.atomic():
+                backend.index(chunk)
+            indexed += len(chunk)
+            if progress:
+                progress(indexed)
+    backend.optimize()
+    if isinstance(backend, PythonSearchBackend):
+        backend.loaded = True
+    return indexed
@@ -1,8 +1,14 @@
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 
-from .models import Author
+from accounts.backends import invalidate_user
+
+from . import archive, fragments, images, related, search, stats
+from .models import Author, AuthorStats, BlogPost, Comment
 
 
 @receiver(post_save, sender=User)
@@ -15,3 +21,195 @@ def create_or_update_author(sender, instance, created, **kwargs):
             last_name=instance.last_name,
         )
 
+
+def _bump_comment_counters(comment, delta):
+    counters = {"comment_count": Greatest(F("comment_count") + delta, 0)}
+    if comment.parent_id:
+        counters["reply_count"] = Greatest(F("reply_count") + delta, 0)
+    BlogPost.objects.filter(pk=comment.post_id).update(**counters)
+
+
+@receiver(post_save, sender=Comment)
+def increment_comment_counters(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        _bump_comment_counters(instance, 1)
+
+
+# Replies removed through the ``parent`` cascade get their own post_delete,
+# so every deleted row is counted exactly once.
+@receiver(post_delete, sender=Comment)
+def decrement_comment_counters(sender, instance, **kwargs):
+    _bump_comment_counters(instance, -1)
+
+
+@receiver(post_save, sender=BlogPost)
+def index_post(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields and not {"title", "content"} & set(update_fields)):
+        return
+    search.index_post(instance)
+
+
+@receiver(post_save, sender=BlogPost)
+def relate_post(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields and not {"title", "content"} & set(update_fields)):
+        return
+    # Scoring reads every post sharing a term; keep it out of the save's
+    # transaction.
+    transaction.on_commit(lambda: related.safe_update_post(instance.pk))
+
+
+@receiver(post_delete, sender=BlogPost)
+def unindex_post(sender, instance, **kwargs):
+    search.remove_post(instance.pk)
+
+
+@receiver(post_save, sender=Comment)
+def index_comment(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index_comment(instance)
+
+
+@receiver(post_delete, sender=Comment)
+def unindex_comment(sender, instance, **kwargs):
+    search.remove_comment(instance.pk)
+
+
+@receiver(post_save, sender=BlogPost)
+def generate_image_derivatives(sender, instance, raw=False, **kwargs):
+    if not raw and images.needs_derivatives(instance):
+        transaction.on_commit(lambda: images.schedule_derivatives(instance))
+
+
+@receiver(post_save, sender=BlogPost)
+@receiver(post_delete, sender=BlogPost)
+def invalidate_post_fragments(sender, instance, **kwargs):
+    fragments.invalidate_post(instance.pk)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment_fragments(sender, instance, **kwargs):
+    fragments.invalidate_comments(instance.post_id)
+
+
+def _invalidate_author_fragments(author_id):
+    fragments.invalidate_author(
+        BlogPost.objects.filter(author_id=author_id).values_list("pk", flat=True),
+        Comment.objects.filter(author_id=author_id)
+        .order_by()
+        .values_list("post_id", flat=True)
+        .distinct(),
+    )
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_fragments(
+    sender, instance, created, raw=False, update_fields=None, **kwargs
+):
+    # Logins save last_login alone; only a username change shows on pages.
+    if created or raw or (update_fields and "username" not in update_fields):
+        return
+    author_id = (
+        Author.objects.filter(user=instance).values_list("pk", flat=True).first()
+    )
+    if author_id:
+        _invalidate_author_fragments(author_id)
+
+
+@receiver(post_save, sender=Author)
+def invalidate_author_fragments(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        _invalidate_author_fragments(instance.pk)
+
+
+@receiver(post_save, sender=Author)
+def create_author_stats(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        AuthorStats.objects.get_or_create(author=instance)
+
+
+@receiver(post_save, sender=BlogPost)
+def count_post(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    new = (instance.author_id, instance.is_published)
+    old = (None, False) if created else getattr(instance, "_counted_as", None)
+    instance._counted_as = new
+    if old is None:
+        # Saved from an instance loaded without these fields; nothing to
+        # diff against, so leave it to reconcile_author_stats.
+        return
+    if old[0] == new[0]:
+        stats.adjust(new[0], when=instance.updated_at, published_count=new[1] - old[1])
+        return
+    stats.adjust(
+        old[0],
+        post_count=-1,
+        published_count=-old[1],
+        comments_received=-instance.comment_count,
+    )
+    stats.adjust(
+        new[0],
+        when=instance.updated_at,
+        post_count=1,
+        published_count=new[1],
+        comments_received=instance.comment_count,
+    )
+
+
+@receiver(post_delete, sender=BlogPost)
+def uncount_post(sender, instance, **kwargs):
+    author_id, is_published = getattr(
+        instance, "_counted_as", (instance.author_id, instance.is_published)
+    )
+    stats.adjust(author_id, post_count=-1, published_count=-is_published)
+
+
+@receiver(post_save, sender=BlogPost)
+def archive_post(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields and not BlogPost.PUBLICATION_FIELDS & set(update_fields)):
+        return
+    new = instance.archive_month
+    old = None if created else getattr(instance, "_archived_as", False)
+    instance._archived_as = new
+    if old is False:
+        # Saved from an instance loaded without the publication fields;
+        # leave it to rebuild_archive.
+        return
+    if old != new:
+        archive.adjust({old: -1, new: 1})
+
+
+@receiver(post_delete, sender=BlogPost)
+def unarchive_post(sender, instance, **kwargs):
+    month = getattr(instance, "_archived_as", False)
+    if month is False:
+        month = instance.archive_month
+    archive.adjust({month: -1})
+
+
+@receiver(post_save, sender=Comment)
+def count_comment(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        stats.adjust_post_author(instance.post_id, comments_received=1)
+        stats.adjust(instance.author_id, when=instance.created_at, comments_written=1)
+
+
+# A post's comments are deleted before the post itself, so the subquery
+# still finds the post's author.
+@receiver(post_delete, sender=Comment)
+def uncount_comment(sender, instance, **kwargs):
+    stats.adjust_post_author(instance.post_id, comments_received=-1)
+    stats.adjust(instance.author_id, comments_written=-1)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    invalidate_user(instance.pk)
+
+
+@receiver(post_save, sender=Author)
+@receiver(post_delete, sender=Author)
+def invalidate_cached_author(sender, instance, **kwargs):
+    invalidate_user(instance.user_id)
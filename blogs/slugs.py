@@ -0,0 +1,96 @@
+import re
+from collections import defaultdict
+
+from django.db.models import Count, IntegerField, Max, Q
+from django.db.models.functions import Cast, Substr
+from django.utils.text import slugify
+
+DEFAULT_SLUG = "post"
+
+
+def base_slug(title):
+    return slugify(title) or DEFAULT_SLUG
+
+
+def _suffix_pattern(bases):
+    return r"^(%s)-[0-9]+$" % "|".join(re.escape(base) for base in bases)
+
+
+def _slug_range(base):
+    # ``base`` and every ``base-...`` sort in [base, base + "."): slugs only
+    # hold letters, digits, "_" and "-", and "." is the character after "-".
+    # A range scan on the slug index, which neither the regex nor a LIKE
+    # prefix match can use on SQLite.
+    return Q(slug__gte=base, slug__lt=f"{base}.")
+
+
+def next_free_slug(queryset, base):
+    """
+    Return ``base`` or ``base-<n>`` with the next unused suffix.
+
+    One aggregate query over the slugs starting with ``base`` finds whether
+    ``base`` is taken and the highest numeric suffix in use, instead of
+    probing ``base-1``, ``base-2``, ...
+    """
+    suffixed = Q(slug__regex=_suffix_pattern([base]))
+    taken = queryset.filter(_slug_range(base)).aggregate(
+        exact=Count("pk", filter=Q(slug=base)),
+        top=Max(
+            Cast(Substr("slug", len(base) + 2), IntegerField()),
+            filter=suffixed,
+        ),
+    )
+    if not taken["exact"]:
+        return base
+    return f"{base}-{(taken['top'] or 0) + 1}"
+
+
+def assign_unique_slugs(objs, queryset, chunk_size=500, reserved=None):
+    """
+    Fill in ``slug`` on every object in ``objs`` that has none, or whose slug
+    an earlier object in ``objs`` or ``reserved`` already has.
+
+    Existing slugs are read once per ``chunk_size`` distinct base slugs, and
+    collisions inside ``objs`` itself are resolved in memory, so importing
+    thousands of posts costs a handful of queries. ``reserved`` is a set of
+    slugs to avoid besides those in ``queryset``, such as the ones given out
+    earlier in the same import; the slugs assigned here are added to it.
+    """
+    reserved = set() if reserved is None else reserved
+    pending = []
+    for obj in objs:
+        if obj.slug and obj.slug not in reserved:
+            reserved.add(obj.slug)
+        else:
+            pending.append((obj, base_slug(obj.title)))
+    wanted = {base for _, base in pending}
+    distinct = sorted(wanted)
+
+    exact = set()
+    top = defaultdict(int)
+    for start in range(0, len(distinct), chunk_size):
+        chunk = distinct[start : start + chunk_size]
+        ranges = Q()
+        for base in chunk:
+            ranges |= _slug_range(base)
+        slugs = (
+            queryset.filter(ranges)
+            .filter(Q(slug__in=chunk) | Q(slug__regex=_suffix_pattern(chunk)))
+            .order_by()
+            .values_list("slug", flat=True)
+        )
+        for slug in slugs:
+            if slug in wanted:
+                exact.add(slug)
+            base, _, suffix = slug.rpartition("-")
+            if suffix.isdigit() and base in wanted:
+                top[base] = max(top[base], int(suffix))
+
+    for obj, base in pending:
+        slug = base
+        while slug in exact or slug in reserved:
+            top[base] += 1
+            slug = f"{base}-{top[base]}"
+        reserved.add(slug)
+        obj.slug = slug
+    return objs
@@ -0,0 +1,95 @@
+from django.db.models import Count, F, Max, Q, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Author, AuthorStats, BlogPost, Comment
+
+
+def _changes(deltas, when):
+    changes = {
+        field: Greatest(F(field) + delta, 0) for field, delta in deltas.items() if delta
+    }
+    if when is not None:
+        changes["last_activity_at"] = Coalesce(
+            Greatest(F("last_activity_at"), when), when
+        )
+    return changes
+
+
+def adjust(author_id, when=None, **deltas):
+    """
+    Add ``deltas`` to an author's counters in one UPDATE, and move their last
+    activity forward to ``when``.
+    """
+    changes = _changes(deltas, when)
+    if author_id and changes:
+        AuthorStats.objects.filter(author_id=author_id).update(**changes)
+
+
+def adjust_post_author(post_id, **deltas):
+    """Like adjust(), for the author of a post, without loading the post."""
+    changes = _changes(deltas, None)
+    if changes:
+        author = BlogPost.objects.filter(pk=post_id).values("author_id")
+        AuthorStats.objects.filter(author_id=Subquery(author)).update(**changes)
+
+
+def rebuild(chunk_size=500, progress=None):
+    """
+    Recompute every author's stats from the posts and comments tables,
+    ``chunk_size`` authors at a time with three grouped queries and one
+    upsert per chunk. Returns the number of authors.
+    """
+    authors = Author.objects.order_by("pk").values_list("pk", flat=True)
+    rebuilt = 0
+    last_pk = None
+    while True:
+        chunk = authors.filter(pk__gt=last_pk) if last_pk else authors
+        ids = list(chunk[:chunk_size])
+        if not ids:
+            return rebuilt
+        stats = {pk: AuthorStats(author_id=pk) for pk in ids}
+
+        def seen(author_id, when):
+            item = stats[author_id]
+            if when and (not item.last_activity_at or when > item.last_activity_at):
+                item.last_activity_at = when
+
+        for row in (
+            BlogPost.objects.filter(author__in=ids)
+            .values("author")
+            .order_by()
+            .annotate(
+                total=Count("pk"),
+                published=Count("pk", filter=Q(is_published=True)),
+                latest=Max("updated_at"),
+            )
+        ):
+            stats[row["author"]].post_count = row["total"]
+            stats[row["author"]].published_count = row["published"]
+            seen(row["author"], row["latest"])
+        for row in (
+            Comment.objects.filter(post__author__in=ids)
+            .values("post__author")
+            .order_by()
+            .annotate(total=Count("pk"))
+        ):
+            stats[row["post__author"]].comments_received = row["total"]
+        for row in (
+            Comment.objects.filter(author__in=ids)
+            .values("author")
+            .order_by()
+            .annotate(total=Count("pk"), latest=Max("created_at"))
+        ):
+            stats[row["author"]].comments_written = row["total"]
+            seen(row["author"], row["latest"])
+
+        AuthorStats.objects.bulk_create(
+            stats.values(),
+            update_conflicts=True,
+            unique_fields=["author"],
+            update_fields=[*AuthorStats.COUNTERS, "last_activity_at"],
+        )
+        rebuilt += len(ids)
+        last_pk = ids[-1]
+        if progress:
+            progress(rebuilt)
@@ -0,0 +1,188 @@
+import io
+import json
+import os
+import random
+import tempfile
+import uuid
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from PIL import Image
+
+from .images import render_derivatives
+from .models import Author, AuthorStats, BlogPost, Status
+
+COVER_IMAGE = "synthetic/cover.jpg"
+PASSWORD = "synthetic-password"
+EPOCH = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+
+WORDS = (
+    "async cache query index latency thread request render template cursor "
+    "database replica commit page slug comment reply author draft publish "
+    "signal worker batch queue search token vector memory profile budget "
+    "django python sqlite server client header stream buffer session model "
+    "migration schema field record import export image variant fragment "
+    "benchmark percentile throughput counter archive feed trending related"
+).split()
+
+
+def ensure_cover_image():
+    """
+    Store the image every synthetic post points at, with its derivatives.
+
+    Returns the ``image_variants`` mapping so posts can be saved with
+    responsive images already in place.
+    """
+    if not default_storage.exists(COVER_IMAGE):
+        image = Image.linear_gradient("L").resize((1200, 800)).convert("RGB")
+        buffer = io.BytesIO()
+        image.save(buffer, "JPEG", quality=80)
+        default_storage.save(COVER_IMAGE, ContentFile(buffer.getvalue()))
+    return render_derivatives(default_storage.path(COVER_IMAGE), COVER_IMAGE)
+
+
+def create_authors(count, prefix="synthetic"):
+    """
+    Create ``count`` users with authors, reusing any left by a previous run.
+
+    All of them share one password hash, since hashing is by far the most
+    expensive part of creating a user. Returns the author emails.
+    """
+    emails = [f"{prefix}{number}@example.com" for number in range(count)]
+    existing = set(
+        User.objects.filter(email__in=emails).values_list("email", flat=True)
+    )
+    password = make_password(PASSWORD)
+    User.objects.bulk_create(
+        [
+            User(
+                username=email.split("@")[0],
+                email=email,
+                first_name="Synthetic",
+                last_name=email.split("@")[0],
+                password=password,
+            )
+            for email in emails
+            if email not in existing
+        ]
+    )
+    # bulk_create skips the post_save signals that normally create authors
+    # and their stats rows.
+    authors = Author.objects.bulk_create(
+        [
+            Author(
+                user=user,
+                email=user.email,
+                first_name=user.first_name,
+                last_name=user.last_name,
+            )
+            for user in User.objects.filter(email__in=emails, author__isnull=True)
+        ]
+    )
+    AuthorStats.objects.bulk_create(
+        [AuthorStats(author=author) for author in authors], ignore_conflicts=True
+    )
+    return emails
+
+
+def _uuid(rng):
+    return uuid.UUID(int=rng.getrandbits(128), version=4)
+
+
+def _words(rng, low, high):
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(low, high)))
+
+
+def _content(rng):
+    return "\n\n".join(
+        _words(rng, 40, 90).capitalize() + "." for _ in range(rng.randint(3, 6))
+    )
+
+
+def rows(emails, posts, comments, depth, seed=0):
+    """
+    Yield ``posts`` posts and up to ``comments`` comments on each of them
+    as import_blog rows.
+
+    The same arguments always produce the same rows, ids and timestamps.
+    Replies nest at most ``depth`` levels below a top-level comment, and
+    every parent is yielded before its replies.
+    """
+    rng = random.Random(seed)
+    created = []
+    for number in range(posts):
+        pk = _uuid(rng)
+        created_at = EPOCH + timedelta(minutes=7 * number, seconds=rng.randrange(60))
+        published = rng.random() < 0.8
+        created.append((pk, created_at))
+        yield {
+            "type": "post",
+            "id": str(pk),
+            "title": _words(rng, 3, 8).title(),
+            "content": _content(rng),
+            "image": COVER_IMAGE,
+            "author_email": rng.choice(emails),
+            "is_published": published,
+            "published_at": created_at.isoformat() if published else None,
+            "status": Status.PUBLISHED if published else Status.DRAFT,
+            "created_at": created_at.isoformat(),
+        }
+
+    for post_id, post_created_at in created:
+        thread = []
+        for number in range(comments):
+            parents = [item for item in thread if item[1] < depth]
+            parent = rng.choice(parents) if parents and rng.random() < 0.6 else None
+            pk = _uuid(rng)
+            thread.append((pk, parent[1] + 1 if parent else 0))
+            yield {
+                "type": "comment",
+                "id": str(pk),
+                "post_id": str(post_id),
+                "parent_id": str(parent[0]) if parent else None,
+                "author_email": rng.choice(emails),
+                "content": _words(rng, 5, 30).capitalize() + ".",
+                "created_at": (
+                    post_created_at
+                    + timedelta(minutes=number + 1, seconds=rng.randrange(60))
+                ).isoformat(),
+            }
+
+
+def generate(
+    authors=10, posts=100, comments=10, depth=3, seed=0, batch_size=1000, stdout=None
+):
+    """
+    Fill the database with reproducible synthetic authors, posts and
+    threaded comments.
+
+    Rows go through import_blog, so slugs, excerpts, comment paths, counters
+    and the search index are built exactly as for a real import. Returns the
+    author emails.
+    """
+    variants = ensure_cover_image()
+    emails = create_authors(authors)
+    with tempfile.NamedTemporaryFile(
+        "w", suffix=".jsonl", encoding="utf-8", delete=False
+    ) as out:
+        for row in rows(emails, posts, comments, depth, seed):
+            out.write(json.dumps(row))
+            out.write("\n")
+    try:
+        call_command(
+            "import_blog",
+            out.name,
+            batch_size=batch_size,
+            stdout=stdout or io.StringIO(),
+        )
+    finally:
+        os.unlink(out.name)
+    BlogPost.objects.filter(image=COVER_IMAGE, image_variants={}).update(
+        image_variants=variants
+    )
+    return emails
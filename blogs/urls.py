@@ -1,12 +1,42 @@
+from django.conf import settings
 from django.urls import path
 
 from . import views
 
+# ASGI deployments serve the read-heavy views natively async; see
+# BLOG_ASYNC_VIEWS in settings and inkwell/asgi.py.
+if getattr(settings, "BLOG_ASYNC_VIEWS", False):
+    list_view = views.AsyncBlogListView
+    detail_view = views.AsyncBlogDetailView
+    feed_view = views.AsyncBlogFeedView
+else:
+    list_view = views.BlogListView
+    detail_view = views.BlogDetailView
+    feed_view = views.BlogFeedView
+
 app_name = "blogs"
 urlpatterns = [
-    path("", views.BlogListView.as_view(), name="blog_list"),
-    path("detail/<slug:slug>", views.BlogDetailView.as_view(), name="blog_detail"),
+    path("", list_view.as_view(), name="blog_list"),
+    path("detail/<slug:slug>", detail_view.as_view(), name="blog_detail"),
+    path(
+        "detail/<slug:slug>/comments",
+        views.CommentCreateView.as_view(),
+        name="comment_create",
+    ),
+    path("archive/", views.ArchiveIndexView.as_view(), name="archive"),
+    path("archive/<int:year>/", views.BlogArchiveView.as_view(), name="archive_year"),
+    path(
+        "archive/<int:year>/<int:month>/",
+        views.BlogArchiveView.as_view(),
+        name="archive_month",
+    ),
+    path("feed/", feed_view.as_view(), name="blog_feed"),
     path("create/", views.BlogCreateView.as_view(), name="blog_create"),
     path("edit/<slug:slug>", views.BlogUpdateView.as_view(), name="blog_edit"),
     path("delete/<slug:slug>", views.BlogDeleteView.as_view(), name="blog_delete"),
+    path("search/", views.BlogSearchView.as_view(), name="blog_search"),
+    path(
+        "authors/<uuid:pk>/", views.AuthorProfileView.as_view(), name="author_profile"
+    ),
+    path("cache/stats/", views.FragmentCacheStatsView.as_view(), name="cache_stats"),
 ]
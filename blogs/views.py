@@ -1,16 +1,37 @@
+import uuid
+
+from asgiref.sync import sync_to_async
 from django.conf import settings
 from django.contrib import messages
-from django.contrib.auth.decorators import login_required
+from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
-from django.core.mail import send_mail
-from django.shortcuts import redirect
-from django.urls import reverse_lazy
+from django.core.exceptions import ValidationError
+from django.http import Http404, HttpResponse, JsonResponse
+from django.shortcuts import redirect, render
+from django.template.loader import render_to_string
+from django.urls import reverse, reverse_lazy
+from django.utils import timezone
 from django.utils.decorators import method_decorator
-from django.views.generic import DetailView, ListView
+from django.utils.feedgenerator import Rss201rev2Feed
+from django.views import View
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+from django.views.generic import DetailView, ListView, TemplateView
 from django.views.generic.edit import CreateView, DeleteView, UpdateView
 
+from . import archive, comments, fragments, popularity, related
+from .conditional import (
+    aconditional_response,
+    adetail_etag,
+    alist_etag,
+    detail_etag,
+    list_etag_func,
+)
 from .forms import BlogPostForm, CommentForm
-from .models import BlogPost
+from .models import AuthorStats, BlogPost, Comment
+from .outbox import enqueue_email
+from .pagination import akeyset_paginate, decode_cursor, keyset_paginate
+from .search import search
 
 # Create your views here.
 
@@ -33,13 +54,7 @@ class BlogCreateView(LoginRequiredMixin, CreateView):
                 f"View or edit your post anytime on the blog platform.\n\n"
                 f"Thank you,\nThe Blog Team"
             )
-            send_mail(
-                subject=subject,
-                message=message,
-                from_email=settings.EMAIL_HOST_USER,
-                recipient_list=[email],
-                fail_silently=True,
-            )
+            enqueue_email(subject, message, [email])
 
         messages.success(self.request, "Blog post created successfully")
         return response
@@ -48,7 +63,32 @@ class BlogCreateView(LoginRequiredMixin, CreateView):
         return reverse_lazy("blogs:blog_detail", kwargs={"slug": self.object.slug})
 
 
-class BlogUpdateView(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
+class PostOwnerRequiredMixin(LoginRequiredMixin, UserPassesTestMixin):
+    """
+    Let only a post's author, or a superuser, through.
+
+    The post is fetched once per request with its author and user joined,
+    and that one instance serves the permission check, the form and the
+    notification email.
+    """
+
+    def get_queryset(self):
+        return super().get_queryset().select_related("author__user")
+
+    def get_object(self, queryset=None):
+        if queryset is not None:
+            return super().get_object(queryset)
+        if not hasattr(self, "_post"):
+            self._post = super().get_object()
+        return self._post
+
+    def test_func(self):
+        user = self.request.user
+        author = self.get_object().author
+        return user.is_superuser or (author is not None and author.user_id == user.pk)
+
+
+class BlogUpdateView(PostOwnerRequiredMixin, UpdateView):
     model = BlogPost
     template_name = "blogs/blog_create_edit.html"
     form_class = BlogPostForm
@@ -59,11 +99,6 @@ class BlogUpdateView(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
     def get_success_url(self):
         return reverse_lazy("blogs:blog_detail", kwargs={"slug": self.object.slug})
 
-    def test_func(self):
-        user = self.request.user
-        blog = self.get_object()
-        return user.is_superuser or blog.author == user.author
-
     def form_valid(self, form):
         response = super().form_valid(form)
         email = getattr(form.instance.author.user, "email", None)
@@ -75,18 +110,12 @@ class BlogUpdateView(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
                 f"Check it out on the platform.\n\n"
                 f"Regards,\nYour Blog Platform"
             )
-            send_mail(
-                subject=subject,
-                message=message,
-                from_email=settings.EMAIL_HOST_USER,
-                recipient_list=[email],
-                fail_silently=True,
-            )
+            enqueue_email(subject, message, [email])
         messages.success(self.request, "Blog post updated successfully!")
         return response
 
 
-class BlogDeleteView(LoginRequiredMixin, UserPassesTestMixin, DeleteView):
+class BlogDeleteView(PostOwnerRequiredMixin, DeleteView):
     model = BlogPost
     template_name = "blogs/blog_delete_confirm.html"
     context_object_name = "blog"
@@ -94,19 +123,13 @@ class BlogDeleteView(LoginRequiredMixin, UserPassesTestMixin, DeleteView):
     slug_field = "slug"
     slug_url_kwarg = "slug"
 
-    def test_func(self):
-        user = self.request.user
-        blog = self.get_object()
-        return user.is_superuser or blog.author == user.author
-
     def post(self, request, *args, **kwargs):
         self.object = self.get_object()  # Retrieve the blog post before deletion
         blog_title = self.object.title
-        author_email = self.object.author.user.email
+        author = self.object.author
+        author_email = author.user.email if author else None
         deleted_by = self.request.user.username
 
-        print("Author email:", author_email)
-
         if author_email:
             subject = "Blog Post Deleted"
             message = (
@@ -115,32 +138,176 @@ class BlogDeleteView(LoginRequiredMixin, UserPassesTestMixin, DeleteView):
                 f"If this was not expected, please contact the admin.\n\n"
                 f"Regards,\nYour Blog Platform"
             )
-            try:
-                send_mail(
-                    subject,
-                    message,
-                    settings.EMAIL_HOST_USER,
-                    [author_email],
-                    fail_silently=False,  # <-- Temporarily set to False to catch errors
-                )
-                print(f"Email sent to {author_email}")
-            except Exception as e:
-                print("Email sending failed:", e)
+            enqueue_email(subject, message, [author_email])
 
         messages.success(request, "Blog post deleted successfully!")
         return super().post(request, *args, **kwargs)
 
 
+list_etag = list_etag_func(lambda request: BlogListView.page_size_for(request))
+
+
 @method_decorator(login_required, name="get")
+@method_decorator(cache_control(private=True, no_cache=True), name="get")
+@method_decorator(condition(etag_func=list_etag), name="get")
 class BlogListView(ListView):
     model = BlogPost
     template_name = "blogs/blog_post_list.html"
     context_object_name = "blogs"
-    ordering = ["-created_at"]
-    paginate_by = 2
+    ordering = ["-created_at", "-id"]
+    keyset_field = "created_at"
+    paginate_by = getattr(settings, "BLOG_LIST_PAGE_SIZE", 2)
+    max_paginate_by = 50
 
+    # The columns the post cards show.
+    list_fields = (
+        "id",
+        "title",
+        "slug",
+        "image",
+        "image_variants",
+        "excerpt",
+        "reading_time",
+        "comment_count",
+        "created_at",
+        "author__id",
+        "author__user__id",
+        "author__user__username",
+    )
 
-@method_decorator(login_required, name="dispatch")
+    def get_queryset(self):
+        return (
+            BlogPost.objects.select_related("author__user")
+            .only(*self.list_fields)
+            .order_by(*self.ordering)
+        )
+
+    @classmethod
+    def page_size_for(cls, request):
+        try:
+            page_size = int(request.GET.get("page_size", cls.paginate_by))
+        except ValueError:
+            page_size = cls.paginate_by
+        return max(1, min(page_size, cls.max_paginate_by))
+
+    def get_paginate_by(self, queryset):
+        return self.page_size_for(self.request)
+
+    def paginate_queryset(self, queryset, page_size):
+        after = decode_cursor(self.request.GET.get("after", ""))
+        before = decode_cursor(self.request.GET.get("before", ""))
+        page = keyset_paginate(
+            queryset, page_size, after=after, before=before, field=self.keyset_field
+        )
+        return None, page, page.object_list, page.has_other_pages()
+
+    def get_list_html(self, *parts):
+        """The cached post cards and pager; ``parts`` tell lists apart."""
+        page_size_param = (
+            self.get_paginate_by(None) if "page_size" in self.request.GET else ""
+        )
+        return fragments.get_or_render(
+            fragments.POST_LIST,
+            [fragments.LIST_SCOPE],
+            [
+                *parts,
+                self.request.GET.get("after", ""),
+                self.request.GET.get("before", ""),
+                page_size_param,
+            ],
+            lambda: self.render_list(page_size_param),
+        )
+
+    def get(self, request, *args, **kwargs):
+        self.object_list = self.get_queryset()
+        list_html = self.get_list_html()
+        trending_html = fragments.get_or_render(
+            fragments.TRENDING,
+            [fragments.LIST_SCOPE, fragments.TRENDING_SCOPE],
+            [],
+            lambda: self.render_trending(popularity.trending()),
+        )
+        return self.render_to_response(
+            {"view": self, "list_html": list_html, "trending_html": trending_html}
+        )
+
+    def render_list(self, page_size_param):
+        context = self.get_context_data(page_size_param=page_size_param)
+        return render_to_string("blogs/partials/post_list.html", context)
+
+    def render_trending(self, trending):
+        return render_to_string("blogs/partials/trending.html", {"trending": trending})
+
+
+def render_archive_months():
+    return render_to_string(
+        "blogs/partials/archive_months.html", {"months": archive.months()}
+    )
+
+
+@method_decorator(login_required, name="get")
+class ArchiveIndexView(TemplateView):
+    template_name = "blogs/blog_archive.html"
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["months_html"] = fragments.get_or_render(
+            fragments.ARCHIVE, [fragments.ARCHIVE_SCOPE], [], render_archive_months
+        )
+        return context
+
+
+@method_decorator(login_required, name="get")
+@method_decorator(cache_control(private=True, no_cache=True), name="get")
+class BlogArchiveView(BlogListView):
+    """
+    Published posts of one year or month, newest first, paged by keyset over
+    the (is_published, published_at) index. The month list beside them comes
+    from the ArchiveMonth rollup rather than grouping the posts table.
+    """
+
+    template_name = "blogs/blog_archive.html"
+    ordering = ["-published_at", "-id"]
+    keyset_field = "published_at"
+    list_fields = (*BlogListView.list_fields, "published_at")
+
+    def get_queryset(self):
+        start, end = self.date_range
+        # IN rather than is_published=True, which SQLite cannot look up in
+        # the index; see archive.published_posts().
+        return (
+            super()
+            .get_queryset()
+            .filter(
+                is_published__in=[True], published_at__gte=start, published_at__lt=end
+            )
+        )
+
+    def get(self, request, year, month=None):
+        try:
+            self.date_range = archive.month_range(year, month)
+        except ValueError:
+            raise Http404("No archive for this date")
+        self.object_list = self.get_queryset()
+        list_html = self.get_list_html("archive", year, month or "")
+        months_html = fragments.get_or_render(
+            fragments.ARCHIVE, [fragments.ARCHIVE_SCOPE], [], render_archive_months
+        )
+        return self.render_to_response(
+            {
+                "view": self,
+                "list_html": list_html,
+                "months_html": months_html,
+                "archive_start": self.date_range[0],
+                "archive_month": month,
+            }
+        )
+
+
+@method_decorator(login_required, name="get")
+@method_decorator(login_required, name="post")
+@method_decorator(cache_control(private=True, no_cache=True), name="get")
+@method_decorator(condition(etag_func=detail_etag), name="get")
 class BlogDetailView(DetailView):
     model = BlogPost
     template_name = "blogs/blog_detail.html"
@@ -148,14 +315,80 @@ class BlogDetailView(DetailView):
     slug_field = "slug"
     slug_url_kwarg = "slug"
 
+    comments_per_page = getattr(settings, "COMMENTS_PER_PAGE", 10)
+    comment_max_depth = getattr(settings, "COMMENT_MAX_DEPTH", 3)
+
+    def get_queryset(self):
+        # The page shows the stored HTML; the raw content is never needed.
+        return BlogPost.objects.select_related("author__user").defer("content")
+
+    def get(self, request, *args, **kwargs):
+        response = super().get(request, *args, **kwargs)
+        # Counted in memory; see blogs.popularity.
+        popularity.record_view(self.object.pk)
+        return response
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context["comments"] = self.object.comments.filter(
-            parent__isnull=True
-        ).prefetch_related("replies")
+        post = self.object
+        after = self.request.GET.get("comments_after", "")
+        before = self.request.GET.get("comments_before", "")
+        context["body_html"] = fragments.get_or_render(
+            fragments.POST_BODY,
+            [fragments.body_scope(post.pk)],
+            [],
+            self.render_body,
+        )
+        context["comments_html"] = fragments.get_or_render(
+            fragments.COMMENTS,
+            [fragments.comments_scope(post.pk)],
+            [after, before],
+            lambda: self.render_comments(after, before),
+        )
+        context["related_html"] = fragments.get_or_render(
+            fragments.RELATED,
+            [fragments.RELATED_SCOPE],
+            [post.pk],
+            lambda: self.render_related(related.related_posts(post.pk)),
+        )
         context["comment_form"] = CommentForm()
         return context
 
+    def render_body(self):
+        return render_to_string("blogs/partials/post_body.html", {"blog": self.object})
+
+    def render_related(self, links):
+        return render_to_string("blogs/partials/related_posts.html", {"links": links})
+
+    def get_root_comments(self):
+        return self.object.comments.filter(depth=0).select_related("author__user")
+
+    def render_comment_page(self, page):
+        return render_to_string(
+            "blogs/partials/comment_threads.html",
+            {"blog": self.object, "comments": page},
+        )
+
+    def render_comments(self, after, before):
+        page = keyset_paginate(
+            self.get_root_comments(),
+            self.comments_per_page,
+            after=decode_cursor(after),
+            before=decode_cursor(before),
+        )
+        Comment.load_threads(page.object_list, self.comment_max_depth)
+        return self.render_comment_page(page)
+
+    def get_parent_comment(self, parent_id):
+        try:
+            return (
+                self.object.comments.only("id", "post_id", "parent_id", "path", "depth")
+                .filter(pk=parent_id)
+                .first()
+            )
+        except ValidationError:
+            return None
+
     def post(self, request, *args, **kwargs):
         self.object = self.get_object()
         form = CommentForm(request.POST)
@@ -165,7 +398,290 @@ class BlogDetailView(DetailView):
             comment.post = self.object
             parent_id = request.POST.get("parent_id")
             if parent_id:
-                comment.parent_id = parent_id
+                comment.parent = self.get_parent_comment(parent_id)
+                if comment.parent is None:
+                    messages.error(
+                        request, "The comment you replied to no longer exists."
+                    )
+                    return redirect("blogs:blog_detail", slug=self.object.slug)
             comment.save()
             messages.success(request, "Comment Added Successfully")
         return redirect("blogs:blog_detail", slug=self.object.slug)
+
+
+class CommentCreateView(LoginRequiredMixin, View):
+    """
+    AJAX endpoint for new comments. The comment is queued on the write-behind
+    buffer in blogs.comments and rendered straight away, so posting one
+    neither writes to the database nor re-renders the detail page.
+    """
+
+    http_method_names = ["post"]
+    comment_max_depth = BlogDetailView.comment_max_depth
+
+    def get_parent_comment(self, post_id, parent_id):
+        # The parent may still be waiting in the buffer itself.
+        parent = comments.get_buffer().find(parent_id)
+        if parent is None:
+            try:
+                parent = (
+                    Comment.objects.only("id", "post_id", "parent_id", "path", "depth")
+                    .filter(pk=parent_id)
+                    .first()
+                )
+            except ValidationError:
+                return None
+        if parent is None or parent.post_id != post_id:
+            return None
+        return parent
+
+    def post(self, request, slug):
+        post_id = (
+            BlogPost.objects.filter(slug=slug).values_list("pk", flat=True).first()
+        )
+        if post_id is None:
+            raise Http404("No blog post found matching the query")
+        form = CommentForm(request.POST)
+        if not form.is_valid():
+            return JsonResponse({"errors": form.errors}, status=400)
+        comment = form.save(commit=False)
+        comment.author = request.user.author
+        comment.post_id = post_id
+        parent_id = request.POST.get("parent_id")
+        if parent_id:
+            comment.parent = self.get_parent_comment(post_id, parent_id)
+            if comment.parent is None:
+                return JsonResponse(
+                    {
+                        "errors": {
+                            "parent_id": [
+                                "The comment you replied to no longer exists."
+                            ]
+                        }
+                    },
+                    status=400,
+                )
+        comment.assign_path()
+        comment.indent = min(comment.depth, self.comment_max_depth)
+        comments.get_buffer().add(comment)
+        return render(
+            request, "blogs/partials/comment.html", {"comment": comment}, status=201
+        )
+
+
+# ASGI versions of the read-heavy views. They serve the same pages, but run
+# their queries through the async ORM and the fragment cache's async API.
+# The condition decorator calls its validator functions synchronously, so
+# conditional GET is handled inside get(). Templates read request.user, so it
+# is resolved up front with auser().
+
+
+@method_decorator(login_required, name="get")
+@method_decorator(cache_control(private=True, no_cache=True), name="get")
+class AsyncBlogListView(BlogListView):
+    async def get(self, request, *args, **kwargs):
+        request.user = await request.auser()
+        page_size = self.page_size_for(request)
+        etag = await alist_etag(request, page_size)
+        return await aconditional_response(
+            request, etag, lambda: self.arender(page_size)
+        )
+
+    async def arender(self, page_size):
+        self.object_list = self.get_queryset()
+        page_size_param = page_size if "page_size" in self.request.GET else ""
+        list_html = await fragments.aget_or_render(
+            fragments.POST_LIST,
+            [fragments.LIST_SCOPE],
+            [
+                self.request.GET.get("after", ""),
+                self.request.GET.get("before", ""),
+                page_size_param,
+            ],
+            lambda: self.arender_list(page_size, page_size_param),
+        )
+        trending_html = await fragments.aget_or_render(
+            fragments.TRENDING,
+            [fragments.LIST_SCOPE, fragments.TRENDING_SCOPE],
+            [],
+            self.arender_trending,
+        )
+        return self.render_to_response(
+            {"view": self, "list_html": list_html, "trending_html": trending_html}
+        )
+
+    async def arender_trending(self):
+        return self.render_trending([score async for score in popularity.trending()])
+
+    async def arender_list(self, page_size, page_size_param):
+        self.page = await akeyset_paginate(
+            self.object_list,
+            page_size,
+            after=decode_cursor(self.request.GET.get("after", "")),
+            before=decode_cursor(self.request.GET.get("before", "")),
+        )
+        return self.render_list(page_size_param)
+
+    def paginate_queryset(self, queryset, page_size):
+        # Already fetched by arender_list().
+        return None, self.page, self.page.object_list, self.page.has_other_pages()
+
+
+@method_decorator(login_required, name="get")
+@method_decorator(login_required, name="post")
+@method_decorator(cache_control(private=True, no_cache=True), name="get")
+class AsyncBlogDetailView(BlogDetailView):
+    async def get(self, request, *args, **kwargs):
+        request.user = await request.auser()
+        etag = await adetail_etag(request, kwargs.get(self.slug_url_kwarg))
+        return await aconditional_response(request, etag, self.arender)
+
+    async def arender(self):
+        try:
+            self.object = await self.get_queryset().aget(
+                **{self.slug_field: self.kwargs.get(self.slug_url_kwarg)}
+            )
+        except BlogPost.DoesNotExist:
+            raise Http404("No blog post found matching the query")
+        after = self.request.GET.get("comments_after", "")
+        before = self.request.GET.get("comments_before", "")
+        context = super(BlogDetailView, self).get_context_data()
+        context["body_html"] = await fragments.aget_or_render(
+            fragments.POST_BODY,
+            [fragments.body_scope(self.object.pk)],
+            [],
+            self.render_body,
+        )
+        context["comments_html"] = await fragments.aget_or_render(
+            fragments.COMMENTS,
+            [fragments.comments_scope(self.object.pk)],
+            [after, before],
+            lambda: self.arender_comments(after, before),
+        )
+        context["related_html"] = await fragments.aget_or_render(
+            fragments.RELATED,
+            [fragments.RELATED_SCOPE],
+            [self.object.pk],
+            self.arender_related,
+        )
+        context["comment_form"] = CommentForm()
+        response = self.render_to_response(context)
+        popularity.record_view(self.object.pk)
+        return response
+
+    async def arender_comments(self, after, before):
+        page = await akeyset_paginate(
+            self.get_root_comments(),
+            self.comments_per_page,
+            after=decode_cursor(after),
+            before=decode_cursor(before),
+        )
+        await Comment.aload_threads(page.object_list, self.comment_max_depth)
+        return self.render_comment_page(page)
+
+    async def arender_related(self):
+        return self.render_related(
+            [link async for link in related.related_posts(self.object.pk)]
+        )
+
+    async def post(self, request, *args, **kwargs):
+        # Saving a comment fires the counter, search index and cache
+        # signals; all of that runs on a worker thread, off the event loop.
+        return await sync_to_async(super().post)(request, *args, **kwargs)
+
+
+class BlogFeedView(View):
+    """RSS feed of the latest published posts."""
+
+    feed_size = getattr(settings, "BLOG_FEED_SIZE", 20)
+
+    def get_queryset(self):
+        return (
+            BlogPost.publishes.filter(published_at__lte=timezone.now())
+            .select_related("author__user")
+            .only(
+                "id",
+                "title",
+                "slug",
+                "excerpt",
+                "published_at",
+                "updated_at",
+                "author__id",
+                "author__user__id",
+                "author__user__username",
+            )
+            .order_by("-published_at", "-id")[: self.feed_size]
+        )
+
+    def render_feed(self, posts):
+        request = self.request
+        feed = Rss201rev2Feed(
+            title="Inkwell",
+            link=request.build_absolute_uri(reverse("blogs:blog_list")),
+            description="Latest posts on Inkwell.",
+            language=settings.LANGUAGE_CODE,
+            feed_url=request.build_absolute_uri(),
+        )
+        for post in posts:
+            feed.add_item(
+                title=post.title,
+                link=request.build_absolute_uri(
+                    reverse("blogs:blog_detail", args=[post.slug])
+                ),
+                description=post.excerpt or "",
+                author_name=post.author.user.username if post.author else None,
+                pubdate=post.published_at,
+                updateddate=post.updated_at,
+                unique_id=str(post.pk),
+            )
+        response = HttpResponse(content_type=feed.content_type)
+        feed.write(response, "utf-8")
+        return response
+
+    def get(self, request, *args, **kwargs):
+        return self.render_feed(self.get_queryset())
+
+
+class AsyncBlogFeedView(BlogFeedView):
+    async def get(self, request, *args, **kwargs):
+        posts = [post async for post in self.get_queryset().aiterator()]
+        return self.render_feed(posts)
+
+
+@method_decorator(login_required, name="dispatch")
+class BlogSearchView(TemplateView):
+    template_name = "blogs/blog_search.html"
+    results_limit = 20
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        query = self.request.GET.get("q", "").strip()
+        hits = search(query, limit=self.results_limit) if query else []
+        posts = (
+            BlogPost.objects.select_related("author__user")
+            .only("id", "title", "slug", "created_at", "author__user__username")
+            .in_bulk([uuid.UUID(hit.post_id) for hit in hits])
+        )
+        context["query"] = query
+        context["results"] = [
+            {"hit": hit, "post": posts[uuid.UUID(hit.post_id)]}
+            for hit in hits
+            if uuid.UUID(hit.post_id) in posts
+        ]
+        return context
+
+
+@method_decorator(login_required, name="dispatch")
+class AuthorProfileView(DetailView):
+    template_name = "blogs/author_profile.html"
+    context_object_name = "stats"
+
+    def get_queryset(self):
+        # Everything the page shows is in one row of the stats table.
+        return AuthorStats.objects.select_related("author__user")
+
+
+@method_decorator(user_passes_test(lambda user: user.is_staff), name="dispatch")
+class FragmentCacheStatsView(View):
+    def get(self, request):
+        return JsonResponse(fragments.stats())
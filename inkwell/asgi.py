@@ -12,5 +12,10 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'inkwell.settings')
+# Route the read-heavy blog views to their async versions, and close database
+# connections after each request: under ASGI, sync work runs on executor
+# threads that persistent connections would be pinned to.
+os.environ.setdefault('BLOG_ASYNC_VIEWS', 'True')
+os.environ.setdefault('CONN_MAX_AGE', '0')
 
 application = get_asgi_application()
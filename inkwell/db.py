@@ -0,0 +1,100 @@
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+PRIMARY = DEFAULT_DB_ALIAS
+REPLICA = "replica"
+PIN_COOKIE = "pin_primary"
+
+# Whether reads in the current context must see the primary, and whether the
+# current context has written anything. Both are reset per request by
+# ReadYourWritesMiddleware; outside a request (management commands, workers)
+# the first write pins the rest of the process to the primary.
+_pinned = ContextVar("inkwell_pinned", default=False)
+_wrote = ContextVar("inkwell_wrote", default=False)
+
+
+class PrimaryReplicaRouter:
+    """
+    Send reads to the replica and writes to the primary.
+
+    Reads stay on the primary once the current request has written, while a
+    transaction is open on the primary, and for REPLICA_PIN_SECONDS after the
+    same client last wrote, so a writer always reads its own changes.
+    """
+
+    def db_for_read(self, model, **hints):
+        if (
+            REPLICA not in settings.DATABASES
+            or _pinned.get()
+            or connections[PRIMARY].in_atomic_block
+        ):
+            return PRIMARY
+        return REPLICA
+
+    def db_for_write(self, model, **hints):
+        _pinned.set(True)
+        _wrote.set(True)
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == PRIMARY
+
+
+class ReadYourWritesMiddleware:
+    """
+    Pin unsafe requests, and requests from a client that just wrote, to the
+    primary database.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        tokens = self.pin(request)
+        try:
+            return self.remember_writes(self.get_response(request))
+        finally:
+            self.unpin(tokens)
+
+    async def __acall__(self, request):
+        tokens = self.pin(request)
+        try:
+            return self.remember_writes(await self.get_response(request))
+        finally:
+            self.unpin(tokens)
+
+    def pin(self, request):
+        pinned = request.method not in ("GET", "HEAD", "OPTIONS") or (
+            PIN_COOKIE in request.COOKIES
+        )
+        return _pinned.set(pinned), _wrote.set(False)
+
+    def unpin(self, tokens):
+        pinned_token, wrote_token = tokens
+        _wrote.reset(wrote_token)
+        _pinned.reset(pinned_token)
+
+    def remember_writes(self, response):
+        if _wrote.get():
+            response.set_cookie(
+                PIN_COOKIE,
+                "1",
+                max_age=getattr(settings, "REPLICA_PIN_SECONDS", 5),
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
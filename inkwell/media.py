@@ -0,0 +1,160 @@
+import mimetypes
+import os
+import re
+from email.utils import formatdate
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured, SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.encoding import iri_to_uri
+from django.utils.http import parse_http_date_safe
+
+# Image derivatives are named after a digest of their contents (see
+# blogs.images), so a name never points at different bytes and can be cached
+# for good. Everything else may be overwritten in place.
+IMMUTABLE_PATH = re.compile(
+    r"^posts/[0-9a-f]{8}(-[0-9a-f]{4}){3}-[0-9a-f]{12}/derivatives/"
+    r"[^/]+\.[0-9a-f]{12}\.\w+$"
+)
+IMMUTABLE_MAX_AGE = 60 * 60 * 24 * 365
+RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def file_validators(stat):
+    etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+    return etag, int(stat.st_mtime)
+
+
+def parse_range(header, size):
+    """
+    Return the inclusive ``(start, end)`` of a single byte range, ``None``
+    when the header should be ignored, or ``(None, None)`` when the range
+    cannot be satisfied.
+
+    Multiple ranges are ignored rather than answered with a multipart body;
+    the whole file is a valid response to them.
+    """
+    match = RANGE.match(header.replace(" ", ""))
+    if match is None:
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        if last and int(last) < start:
+            return None
+        end = min(int(last), size - 1) if last else size - 1
+    elif last and int(last):
+        start, end = max(size - int(last), 0), size - 1
+    elif last:
+        return None, None
+    else:
+        return None
+    if start >= size:
+        return None, None
+    return start, end
+
+
+def range_applies(request, etag, last_modified):
+    if_range = request.headers.get("If-Range")
+    if not if_range:
+        return True
+    if if_range.startswith('"') or if_range.startswith("W/"):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == last_modified
+
+
+def read_range(path, start, length, block_size=FileResponse.block_size):
+    with open(path, "rb") as file:
+        file.seek(start)
+        while length > 0:
+            data = file.read(min(block_size, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+
+
+def file_response(request, path, fullpath, stat, etag, last_modified):
+    content_type, encoding = mimetypes.guess_type(fullpath)
+    content_type = content_type or "application/octet-stream"
+    sendfile = getattr(settings, "MEDIA_SENDFILE", "")
+    if sendfile:
+        # The front-end server reads the file and answers Range requests.
+        response = HttpResponse(content_type=content_type)
+        if sendfile == "x-accel-redirect":
+            prefix = getattr(settings, "MEDIA_ACCEL_PREFIX", "/protected-media/")
+            response.headers["X-Accel-Redirect"] = iri_to_uri(prefix + path)
+        elif sendfile == "x-sendfile":
+            response.headers["X-Sendfile"] = fullpath
+        else:
+            raise ImproperlyConfigured(
+                f"Unknown MEDIA_SENDFILE {sendfile!r}; use 'x-accel-redirect' "
+                f"or 'x-sendfile'."
+            )
+    else:
+        byte_range = None
+        if "Range" in request.headers and range_applies(request, etag, last_modified):
+            byte_range = parse_range(request.headers["Range"], stat.st_size)
+        if byte_range == (None, None):
+            response = HttpResponse(status=416)
+            response.headers["Content-Range"] = f"bytes */{stat.st_size}"
+            return response
+        if byte_range:
+            start, end = byte_range
+            response = StreamingHttpResponse(
+                read_range(fullpath, start, end - start + 1),
+                status=206,
+                content_type=content_type,
+            )
+            response.headers["Content-Length"] = end - start + 1
+            response.headers["Content-Range"] = f"bytes {start}-{end}/{stat.st_size}"
+        else:
+            response = FileResponse(open(fullpath, "rb"), content_type=content_type)
+        response.headers["Accept-Ranges"] = "bytes"
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    return response
+
+
+def serve_media(request, path):
+    """
+    Serve a file from MEDIA_ROOT with ETag/Last-Modified validators.
+
+    Repeat requests carrying ``If-None-Match`` or ``If-Modified-Since`` get a
+    304 from a single ``stat()`` without opening the file. Single byte ranges
+    are honoured, content-hashed image derivatives are cached as immutable,
+    and with ``MEDIA_SENDFILE`` set the file itself is left to the front-end
+    server through ``X-Accel-Redirect`` or ``X-Sendfile``.
+    """
+    try:
+        fullpath = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404("Media file not found.")
+    try:
+        stat = os.stat(fullpath)
+    except OSError:
+        raise Http404("Media file not found.")
+    if not os.path.isfile(fullpath):
+        raise Http404("Media file not found.")
+
+    etag, last_modified = file_validators(stat)
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = file_response(request, path, fullpath, stat, etag, last_modified)
+        if response.status_code == 416:
+            return response
+    response.headers["ETag"] = etag
+    response.headers["Last-Modified"] = formatdate(last_modified, usegmt=True)
+    if IMMUTABLE_PATH.match(path):
+        patch_cache_control(
+            response, public=True, max_age=IMMUTABLE_MAX_AGE, immutable=True
+        )
+    else:
+        patch_cache_control(
+            response,
+            public=True,
+            max_age=getattr(settings, "MEDIA_CACHE_MAX_AGE", 3600),
+        )
+    return response
@@ -0,0 +1,308 @@
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import HttpResponse, HttpResponseForbidden
+from django.template.backends import django as django_backend
+
+logger = logging.getLogger("inkwell.slow_requests")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+UNRESOLVED = "<unresolved>"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value):
+    return str(value).replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+
+
+def _labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ""
+    return "{%s}" % ",".join(f'{name}="{_escape(value)}"' for name, value in pairs)
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for labels, value in sorted(values.items()):
+            yield self.name + _labels(self.labelnames, labels), value
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                series = self._values[labels] = {
+                    "buckets": [0] * len(self.buckets),
+                    "sum": 0,
+                    "count": 0,
+                }
+            if index < len(self.buckets):
+                series["buckets"][index] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def samples(self):
+        with self._lock:
+            values = {
+                labels: dict(series, buckets=list(series["buckets"]))
+                for labels, series in self._values.items()
+            }
+        for labels, series in sorted(values.items()):
+
+            def name(suffix, extra=()):
+                return self.name + suffix + _labels(self.labelnames, labels, extra)
+
+            cumulative = 0
+            for bound, count in zip(self.buckets, series["buckets"]):
+                cumulative += count
+                yield name("_bucket", [("le", _number(bound))]), cumulative
+            yield name("_bucket", [("le", "+Inf")]), series["count"]
+            yield name("_sum"), series["sum"]
+            yield name("_count"), series["count"]
+
+
+REQUESTS = Counter(
+    "inkwell_requests_total",
+    "Requests served, by URL name, method and status code.",
+    ("view", "method", "status"),
+)
+REQUEST_DURATION = Histogram(
+    "inkwell_request_duration_seconds",
+    "Time spent handling a request, by URL name.",
+    ("view", "method"),
+)
+DB_QUERIES = Histogram(
+    "inkwell_db_queries_per_request",
+    "Database queries run while handling a request, by URL name.",
+    ("view",),
+    buckets=QUERY_BUCKETS,
+)
+DB_DURATION = Histogram(
+    "inkwell_db_duration_seconds",
+    "Time spent in database queries per request, by URL name.",
+    ("view",),
+)
+TEMPLATE_DURATION = Histogram(
+    "inkwell_template_render_duration_seconds",
+    "Time spent rendering templates per request, by URL name.",
+    ("view",),
+)
+REGISTRY = [REQUESTS, REQUEST_DURATION, DB_QUERIES, DB_DURATION, TEMPLATE_DURATION]
+
+
+def render_metrics(registry=REGISTRY):
+    lines = []
+    for metric in registry:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(f"{name} {_number(value)}" for name, value in metric.samples())
+    return "\n".join(lines) + "\n"
+
+
+class RequestStats:
+    def __init__(self, capture_sql):
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.template_depth = 0
+        self.sql = [] if capture_sql else None
+
+
+# Requests are tracked through a context variable rather than per-request
+# wrappers: async views run their queries on executor threads, each with its
+# own connection, and context variables follow the request onto them.
+_current = ContextVar("inkwell_request_stats", default=None)
+
+
+def _timed_execute(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - start
+        stats.queries += 1
+        stats.db_time += elapsed
+        if stats.sql is not None:
+            stats.sql.append((context["connection"].alias, elapsed, sql))
+
+
+@receiver(connection_created)
+def instrument_connection(sender, connection, **kwargs):
+    if _timed_execute not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_timed_execute)
+
+
+class TimedTemplate(django_backend.Template):
+    def render(self, *args, **kwargs):
+        stats = _current.get()
+        if stats is None:
+            return super().render(*args, **kwargs)
+        # Fragments rendered with render_to_string inside a page are only
+        # counted once, as part of the outermost render.
+        stats.template_depth += 1
+        start = time.perf_counter()
+        try:
+            return super().render(*args, **kwargs)
+        finally:
+            stats.template_depth -= 1
+            if not stats.template_depth:
+                stats.template_time += time.perf_counter() - start
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+    """
+    The Django template backend, with render time recorded for the request
+    being served. Every TemplateResponse and render_to_string goes through
+    it once it is the BACKEND in TEMPLATES.
+    """
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name).template, self)
+
+
+def slow_request_threshold():
+    threshold = getattr(settings, "SLOW_REQUEST_THRESHOLD_MS", None)
+    return None if threshold is None else threshold / 1000
+
+
+class MetricsMiddleware:
+    """
+    Record latency, database and template time for every request under the
+    name of the URL pattern it resolved to.
+
+    With ``SLOW_REQUEST_THRESHOLD_MS`` set, requests slower than that are
+    logged to ``inkwell.slow_requests`` together with the SQL they ran.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        # Connections opened before this module was imported, e.g. by
+        # startup checks, missed the connection_created signal.
+        for connection in connections.all(initialized_only=True):
+            instrument_connection(None, connection)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats, token = self.begin()
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.record(request, response, stats, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        stats, token = self.begin()
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.record(request, response, stats, time.perf_counter() - start)
+        return response
+
+    def begin(self):
+        stats = RequestStats(capture_sql=slow_request_threshold() is not None)
+        return stats, _current.set(stats)
+
+    def record(self, request, response, stats, elapsed):
+        match = getattr(request, "resolver_match", None)
+        view = (match.view_name if match else None) or UNRESOLVED
+        REQUESTS.inc((view, request.method, response.status_code))
+        REQUEST_DURATION.observe((view, request.method), elapsed)
+        DB_QUERIES.observe((view,), stats.queries)
+        DB_DURATION.observe((view,), stats.db_time)
+        TEMPLATE_DURATION.observe((view,), stats.template_time)
+
+        threshold = slow_request_threshold()
+        if threshold is not None and elapsed >= threshold:
+            self.log_slow_request(request, view, elapsed, stats)
+
+    def log_slow_request(self, request, view, elapsed, stats):
+        queries = "\n".join(
+            f"  [{alias} {duration * 1000:.1f}ms] {sql}"
+            for alias, duration, sql in stats.sql
+        )
+        logger.warning(
+            "Slow request %s %s (%s) took %.1fms: %d queries in %.1fms, "
+            "templates %.1fms\n%s",
+            request.method,
+            request.get_full_path(),
+            view,
+            elapsed * 1000,
+            stats.queries,
+            stats.db_time * 1000,
+            stats.template_time * 1000,
+            queries,
+        )
+
+
+def metrics(request):
+    """
+    Serve the metrics of this process in the Prometheus text format.
+
+    Scrapers must send ``METRICS_TOKEN`` as a bearer token. Without a token
+    configured, only logged-in staff can read them.
+    """
+    token = getattr(settings, "METRICS_TOKEN", "")
+    if token:
+        allowed = request.headers.get("Authorization") == f"Bearer {token}"
+    else:
+        allowed = request.user.is_staff
+    if not allowed:
+        return HttpResponseForbidden()
+    return HttpResponse(render_metrics(), content_type=CONTENT_TYPE)
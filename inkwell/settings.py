@@ -51,6 +51,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "inkwell.metrics.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -58,13 +59,15 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "inkwell.db.ReadYourWritesMiddleware",
 ]
 
 ROOT_URLCONF = "inkwell.urls"
 
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        # DjangoTemplates that times renders for inkwell.metrics.
+        "BACKEND": "inkwell.metrics.DjangoTemplates",
         "DIRS": [BASE_DIR / "templates"],
         "APP_DIRS": True,
         "OPTIONS": {
@@ -83,13 +86,164 @@ WSGI_APPLICATION = "inkwell.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# The database file is switched to WAL once, by migration
+# blogs.0016_sqlite_wal, so readers never block the writer. Every connection
+# waits up to DATABASE_TIMEOUT seconds for a lock instead of failing with
+# "database is locked", and starts write transactions IMMEDIATE so two writers
+# cannot deadlock upgrading a read lock. Connections are kept open for
+# CONN_MAX_AGE seconds and health-checked before reuse. inkwell/asgi.py
+# defaults it to 0: async views run their ORM calls on executor threads, and
+# a persistent connection would stay open per thread. Each ASGI request then
+# pays for a fresh connection and its PRAGMAs, which is cheap for a local
+# SQLite file; set CONN_MAX_AGE explicitly to keep connections instead.
+#
+# Reads go to the "replica" alias through inkwell.db.PrimaryReplicaRouter.
+# By default it is the same file opened query-only; point
+# DATABASE_REPLICA_NAME at a copy kept up to date by e.g. Litestream to move
+# reads off the primary.
+
+SQLITE_PRAGMAS = [
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-20000",
+    "PRAGMA mmap_size=134217728",
+]
+
+DATABASE_NAME = env("DATABASE_NAME", default=str(BASE_DIR / "db.sqlite3"))
+DATABASE_TIMEOUT = env.int("DATABASE_TIMEOUT", default=20)
+CONN_MAX_AGE = env.int("CONN_MAX_AGE", default=600)
+
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+        "NAME": DATABASE_NAME,
+        "CONN_MAX_AGE": CONN_MAX_AGE,
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": {
+            "timeout": DATABASE_TIMEOUT,
+            "transaction_mode": "IMMEDIATE",
+            "init_command": ";".join(SQLITE_PRAGMAS),
+        },
+    },
+    "replica": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": env("DATABASE_REPLICA_NAME", default=DATABASE_NAME),
+        "CONN_MAX_AGE": CONN_MAX_AGE,
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": {
+            "timeout": DATABASE_TIMEOUT,
+            "init_command": ";".join(SQLITE_PRAGMAS + ["PRAGMA query_only=ON"]),
+        },
+        "TEST": {"MIRROR": "default"},
+    },
+}
+
+DATABASE_ROUTERS = ["inkwell.db.PrimaryReplicaRouter"]
+
+# After a request writes, the client's reads stay on the primary for this
+# many seconds so the redirect that follows sees the change.
+REPLICA_PIN_SECONDS = env.int("REPLICA_PIN_SECONDS", default=5)
+
+
+# Cache
+# Local memory by default; set CACHE_BACKEND to
+# django.core.cache.backends.filebased.FileBasedCache and CACHE_LOCATION to a
+# directory to share rendered fragments between worker processes.
+
+CACHES = {
+    "default": {
+        "BACKEND": env(
+            "CACHE_BACKEND", default="django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": env("CACHE_LOCATION", default="inkwell"),
     }
 }
 
+BLOG_FRAGMENT_CACHE_TIMEOUT = env.int("BLOG_FRAGMENT_CACHE_TIMEOUT", default=600)
+
+# Sessions are read from the cache and written through to the database, and
+# the backend below caches each session's User and Author, so a logged-in
+# page view on a warm cache needs no bookkeeping queries. With several
+# processes use a shared cache backend, or invalidations only reach the
+# process that made the change.
+SESSION_ENGINE = env(
+    "SESSION_ENGINE", default="django.contrib.sessions.backends.cached_db"
+)
+AUTHENTICATION_BACKENDS = ["accounts.backends.CachedModelBackend"]
+AUTH_USER_CACHE_TIMEOUT = env.int("AUTH_USER_CACHE_TIMEOUT", default=300)
+
+
+# Resized WebP/JPEG copies of post images are rendered after the save
+# commits, by a pool of IMAGE_DERIVATIVE_WORKERS processes started lazily in
+# each web process. Set IMAGE_DERIVATIVES_SYNC to render them inside the
+# request instead; generate_image_derivatives backfills existing images.
+
+IMAGE_DERIVATIVE_WORKERS = env.int("IMAGE_DERIVATIVE_WORKERS", default=2)
+IMAGE_DERIVATIVES_SYNC = env.bool("IMAGE_DERIVATIVES_SYNC", default=False)
+
+
+# Comments posted through the AJAX endpoint are buffered in each process and
+# written in batches of up to COMMENT_BUFFER_SIZE, at most
+# COMMENT_BUFFER_INTERVAL seconds after they were posted. The buffer is
+# written out when the process exits; set the interval to 0 to write from
+# the request that fills the buffer instead of a background thread.
+
+COMMENT_BUFFER_SIZE = env.int("COMMENT_BUFFER_SIZE", default=50)
+COMMENT_BUFFER_INTERVAL = env.float("COMMENT_BUFFER_INTERVAL", default=1.0)
+
+
+# Post page views are counted in memory by each process and added to hourly
+# buckets every POST_VIEW_FLUSH_INTERVAL seconds. Trending posts on the list
+# page rank those views with a TRENDING_HALF_LIFE_HOURS exponential decay;
+# run rebuild_trending after changing the half-life or bucket size.
+
+POST_VIEW_FLUSH_INTERVAL = env.float("POST_VIEW_FLUSH_INTERVAL", default=10.0)
+POST_VIEW_BUCKET_SECONDS = env.int("POST_VIEW_BUCKET_SECONDS", default=3600)
+TRENDING_HALF_LIFE_HOURS = env.float("TRENDING_HALF_LIFE_HOURS", default=24.0)
+TRENDING_SIZE = env.int("TRENDING_SIZE", default=5)
+
+
+# Each post stores its RELATED_POSTS_K nearest neighbours by TF-IDF similarity
+# of title and content, and its page shows the first RELATED_POSTS_SHOWN that
+# are published. Saving a post updates them; run rebuild_related to refresh
+# the vocabulary and document frequencies.
+
+RELATED_POSTS_K = env.int("RELATED_POSTS_K", default=10)
+RELATED_POSTS_SHOWN = env.int("RELATED_POSTS_SHOWN", default=5)
+
+
+# The post list shows BLOG_LIST_PAGE_SIZE posts per page; readers can ask for
+# up to 50 with ?page_size=.
+
+BLOG_LIST_PAGE_SIZE = env.int("BLOG_LIST_PAGE_SIZE", default=2)
+
+
+# A post page shows COMMENTS_PER_PAGE top-level comments with their whole
+# threads. Replies are indented up to COMMENT_MAX_DEPTH levels and shown at
+# that indent below it.
+
+COMMENTS_PER_PAGE = env.int("COMMENTS_PER_PAGE", default=10)
+COMMENT_MAX_DEPTH = env.int("COMMENT_MAX_DEPTH", default=3)
+
+
+# Serve the list, detail and feed views as async views. inkwell/asgi.py turns
+# this on; under WSGI the sync views avoid an event loop per request. The RSS
+# feed lists the latest BLOG_FEED_SIZE published posts.
+
+BLOG_ASYNC_VIEWS = env.bool("BLOG_ASYNC_VIEWS", default=False)
+BLOG_FEED_SIZE = env.int("BLOG_FEED_SIZE", default=20)
+
+
+# Metrics
+# Per-view latency, query and template histograms are served at /metrics.
+# Set METRICS_TOKEN to require "Authorization: Bearer <token>" from scrapers;
+# without one only logged-in staff can read them. Set
+# SLOW_REQUEST_THRESHOLD_MS to log slower requests with their SQL to the
+# inkwell.slow_requests logger.
+
+METRICS_TOKEN = env("METRICS_TOKEN", default="")
+SLOW_REQUEST_THRESHOLD_MS = env.int("SLOW_REQUEST_THRESHOLD_MS", default=None)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -131,6 +285,31 @@ STATIC_ROOT = BASE_DIR / "staticfiles"
 MEDIA_URL = "media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
+# collectstatic writes content-hashed names plus .gz/.br copies for the
+# front-end server. Off in development so templates work without running
+# collectstatic first.
+STATICFILES_MANIFEST = env.bool("STATICFILES_MANIFEST", default=not DEBUG)
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {
+        "BACKEND": (
+            "inkwell.storage.CompressedManifestStaticFilesStorage"
+            if STATICFILES_MANIFEST
+            else "django.contrib.staticfiles.storage.StaticFilesStorage"
+        )
+    },
+}
+
+# Media is served by inkwell.media.serve_media. Behind nginx set
+# MEDIA_SENDFILE=x-accel-redirect and map MEDIA_ACCEL_PREFIX to an internal
+# location aliasing MEDIA_ROOT; "x-sendfile" suits Apache and lighttpd.
+# Content-hashed image derivatives are cached for a year, everything else
+# for MEDIA_CACHE_MAX_AGE seconds.
+SERVE_MEDIA = env.bool("SERVE_MEDIA", default=True)
+MEDIA_CACHE_MAX_AGE = env.int("MEDIA_CACHE_MAX_AGE", default=3600)
+MEDIA_SENDFILE = env("MEDIA_SENDFILE", default="")
+MEDIA_ACCEL_PREFIX = env("MEDIA_ACCEL_PREFIX", default="/protected-media/")
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -142,3 +321,13 @@ EMAIL_PORT = env.int("EMAIL_PORT")
 EMAIL_USE_TLS = env.bool("EMAIL_USE_TLS")
 EMAIL_HOST_USER = env("EMAIL_HOST_USER")
 EMAIL_HOST_PASSWORD = env("EMAIL_HOST_PASSWORD")
+
+# send_outbox retries a failed email after OUTBOX_RETRY_BASE_SECONDS, doubling
+# up to OUTBOX_RETRY_MAX_SECONDS, and gives up after OUTBOX_MAX_ATTEMPTS.
+# Emails claimed by a worker that stopped for OUTBOX_STALE_CLAIM_SECONDS are
+# handed to the next one.
+
+OUTBOX_MAX_ATTEMPTS = env.int("OUTBOX_MAX_ATTEMPTS", default=5)
+OUTBOX_RETRY_BASE_SECONDS = env.int("OUTBOX_RETRY_BASE_SECONDS", default=30)
+OUTBOX_RETRY_MAX_SECONDS = env.int("OUTBOX_RETRY_MAX_SECONDS", default=3600)
+OUTBOX_STALE_CLAIM_SECONDS = env.int("OUTBOX_STALE_CLAIM_SECONDS", default=600)
@@ -0,0 +1,70 @@
+import gzip
+import os
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.base import ContentFile
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = (
+    ".css",
+    ".js",
+    ".map",
+    ".json",
+    ".svg",
+    ".txt",
+    ".xml",
+    ".html",
+    ".ico",
+    ".ttf",
+    ".otf",
+    ".eot",
+)
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    Content-hashed static files with ``.gz`` and ``.br`` siblings.
+
+    collectstatic writes a gzip and a brotli copy of every hashed text asset
+    so the front-end server can send them as-is (nginx ``gzip_static``/
+    ``brotli_static``). Copies that come out no smaller than the original are
+    not kept. Without the ``brotli`` package collectstatic fails rather than
+    quietly leaving the ``.br`` copies out.
+    """
+
+    min_compress_size = 256
+
+    def post_process(self, paths, dry_run=False, **options):
+        if brotli is None and not dry_run:
+            raise ImproperlyConfigured(
+                "CompressedManifestStaticFilesStorage requires the brotli package."
+            )
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+        if dry_run:
+            return
+        for hashed_name in set(self.hashed_files.values()):
+            self.compress(hashed_name)
+
+    def compressors(self):
+        yield ".gz", lambda data: gzip.compress(data, compresslevel=9, mtime=0)
+        yield ".br", lambda data: brotli.compress(data, quality=11)
+
+    def compress(self, name):
+        if os.path.splitext(name)[1].lower() not in COMPRESSIBLE_EXTENSIONS:
+            return
+        with self.open(name) as original:
+            data = original.read()
+        if len(data) < self.min_compress_size:
+            return
+        for suffix, compress in self.compressors():
+            compressed = compress(data)
+            if len(compressed) >= len(data):
+                continue
+            if self.exists(name + suffix):
+                self.delete(name + suffix)
+            self._save(name + suffix, ContentFile(compressed))